@@ -2,56 +2,55 @@
 # Similar to aria_server_caption.py with some differences. 
 # No longer captions image unless prompeted (Still process images tho)
 # Wake word & Key press only way to make requests 
+# --headless runs without the window; control it with signals or the control socket (see headless.py)
 # IMPORTANT: Change your server address 
 
-import cv2, argparse, time, io, threading, requests, queue, os, sys, warnings
+import cv2, argparse, time, threading, requests, queue, os, sys, warnings, signal
 import numpy as np
-from PIL import Image
-from ollama import Client
 import aria.sdk as aria
 from projectaria_tools.core.sensor_data import ImageDataRecord
-from datetime import datetime
 
 #speech to text imports
-import whisper
-import sounddevice as sd
-import tempfile, subprocess
-import scipy.io.wavfile as wavfile
+import stt #make sure stt.py is in same folder
+import subprocess
 
 #Wake word inputs
 import wake_word #make sure wake_word.py is in same folder
+import audio #make sure audio.py is in same folder
+from audio_stream import shared_stream
+from vad import record_utterance
+from frame_buffer import FrameRingBuffer
+from display import FrameDisplay
+from caption_client import CaptionClient, CaptionServerError
+from frame_quality import sharpest_frame
+from preprocess import FOLLOW_UP_SIZE
+from on_demand_capture import OnDemandCapture, IDLE_FPS
+from headless import StatusLog, ControlServer, SIGNAL_COMMANDS, STATUS_INTERVAL, chatter_to_stderr, add_arguments as add_headless_arguments
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 
-# === Initialize Ollama client ===
-print("Connecting to Ollama...")
-client = Client()
-print("LLaVA (Ollama) client initialized.")
 
-# === Initialize Whisper ===
-#Change to faster-whisper foe faster CPU transcription?
-print("Loading Whisper model...")
-stt_model = whisper.load_model("base", device = "cpu") # also can pick "tiny", "base", "small", and "medium"
-print("Whisper loaded.")
+# === Caption server ===
+CAPTION_SERVER = "http://10.100.241.227:8000" #change to your caption server address
+caption_client = CaptionClient(CAPTION_SERVER, caption_timeout=7) # seconds till timeout. adjust as needed
+SHARPEST_WAIT = 0.3 #seconds to wait for a sharper frame before captioning
+MAX_QUESTION_SECONDS = 10 #longest spoken question; shorter ones end on silence
 
 #Variables for tts interruption
 tts_queue = queue.Queue()
 
-def record_audio(duration=4, fs=16000):
+def record_audio(max_duration=MAX_QUESTION_SECONDS):
+    #one spoken question from the always-on mic stream, ended by trailing silence (vad.py)
+    mic = shared_stream()
     print("Listening...")
-    recording = sd.rec(int(duration * fs), samplerate=fs,
-                    channels=1, dtype="int16")
-    sd.wait()
-    print("Recording finished.")
-    return recording, fs
+    recording, info = record_utterance(mic, max_seconds=max_duration)
+    print(f"Recording finished ({info['reason']}, {info['seconds']:.1f}s of audio).")
+    return recording, mic.fs
 
 def transcribe_audio(recording, fs):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-        wavfile.write(f.name, fs, recording)
-        print("Transcribing...")
-        result = stt_model.transcribe(f.name, fp16=False)
-    os.remove(f.name)
-    return result["text"].strip()
+    #straight from memory, no temp wav or ffmpeg process
+    print("Transcribing...")
+    return audio.transcribe(stt.get_model(), recording, fs, fp16=False)
 
 def stop_current_tts(): #interrupts speech and empty the queue
     while not tts_queue.empty():
@@ -60,12 +59,12 @@ def stop_current_tts(): #interrupts speech and empty the queue
         except queue.Empty:
             break
 
-def log_event(message, logfile="wake_log.txt"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}]  {message}")
-    #Uncomment following if you want datalog.txt
-    #with open(logfile, "a") as f:
-    #    f.write(f"[{timestamp}] {message}\n")
+status_log = StatusLog() #replaced with a JSON lines log in headless mode
+
+def log_event(message, event="log", **fields):
+    #fields only show up in the JSON lines of headless mode
+    status_log.emit(event, message, **fields)
+    #use --status-log FILE if you want a datalog file
 
 def speak_text(text, output_device=None):
     try:
@@ -76,8 +75,10 @@ def speak_text(text, output_device=None):
 
 # === Streaming Observer Class ===
 class StreamingObserver:
-    def __init__(self):
-        self.last_image = None
+    def __init__(self, idle_fps=IDLE_FPS):
+        self.frames = FrameRingBuffer() #last few rgb frames, written by the sdk callback
+        #frames are only looked at when asked, so only a trickle is stored until a request comes in
+        self.capture = OnDemandCapture(self.frames, idle_fps=idle_fps)
         self.caption = "Waiting for image..."
         self.caption_in_progress = False
         self.last_caption = ""
@@ -86,7 +87,7 @@ class StreamingObserver:
 
     def on_image_received(self, image: np.ndarray, record: ImageDataRecord):
         if record.camera_id == aria.CameraId.Rgb:
-            self.last_image = np.rot90(image, -1)
+            self.capture.on_frame(image, record.capture_timestamp_ns)
 
     def _caption_worker(self, image):
         try:
@@ -102,54 +103,41 @@ class StreamingObserver:
         finally:
             self.caption_in_progress = False
 
+    def caption_latest(self) -> str:
+        #caption the sharpest of the next few frames, so head motion blur doesn't end up in the caption
+        with self.capture.active():
+            if not self.capture.wait_fresh():
+                print("No fresh frame from the glasses, captioning the last one")
+            frame, sharpness = sharpest_frame(self.frames, wait_budget=SHARPEST_WAIT, since_seq=self.capture.since_seq)
+        if frame is None:
+            return "No image available yet for captioning."
+        print(f"Captioning frame {frame.seq} (sharpness {sharpness:.0f})")
+        return self.generate_caption(frame.image)
+
     def generate_caption(self, np_img: np.ndarray) -> str:
         try:
-            #convert numpy image to PIL and encode as PNG in memory
-            image = Image.fromarray(np_img).convert("RGB")
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
-
-            #send image to Flask caption server (make sure server is running)
-            files = {'image': ('frame.png', buffer, 'image/png')}
-            response = requests.post(
-                "http://10.100.241.227:8000/caption",
-                files=files,
-                timeout= 7  # seconds till timeout. adjust as needed
-            )
-
-            if response.status_code == 200:
-                return response.json().get("caption", "No caption received.")
-            else:
-                return f"Server error: {response.status_code} - {response.text}"
-        
+            #send image to the caption server (make sure server is running)
+            caption = caption_client.caption(np_img)
+            return caption if caption is not None else "Caption skipped for a newer frame."
+        except CaptionServerError as e:
+            return str(e)
         except requests.exceptions.ConnectTimeout:
             return "Caption server timed out; is it running?"
-        
         except Exception as e:
             return f"Exception during captioning: {e}"
 
     def ask_follow_up(self, question: str) -> str:
-        if self.last_image is None:
-            return "No image available yet for follow-up."
-
         try:
-            qa_start = time.time()
-            image = Image.fromarray(self.last_image).convert("RGB").resize((256, 256))
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
-
-            files = {'image': ('frame.png', buffer, 'image/png')}
-            data = {'question': question}  # assumes your server accepts this
-
-            response = requests.post("http://10.100.241.227:8000/follow_up", files=files, data=data)
-
-            if response.status_code == 200:
-                print(f"Q&A took {time.time() - qa_start:.2f} seconds")
-                return response.json().get("answer", "No answer returned.")
-            else:
-                return f"Server error: {response.status_code} - {response.text}"
+            #the last captioned frame is reused on the server if it is recent, otherwise a fresh frame is uploaded
+            if not caption_client.has_recent_frame():
+                with self.capture.active():
+                    self.capture.wait_fresh()
+            with self.frames.view() as frame:
+                answer = caption_client.follow_up(question, frame.level(FOLLOW_UP_SIZE) if frame is not None else None)
+            if answer is None:
+                return "No image available yet for follow-up."
+            print(f"Q&A took {caption_client.timings['follow_up']['total']:.2f} seconds")
+            return answer
         except Exception as e:
             return f"Exception during follow-up: {e}"
         
@@ -168,8 +156,23 @@ parser.add_argument(
     default="MacBook Pro Speakers",
     help="Specify output device name: 'Bose AE2 Soundlink' or 'MacBook Pro Speakers'"
 )
+parser.add_argument(
+    "--idle-fps",
+    type=float,
+    default=IDLE_FPS,
+    help="RGB frames stored per second between requests (0 = none, grab a fresh frame per request)"
+)
+add_headless_arguments(parser)
 args = parser.parse_args()
 current_audio_output_device = args.output
+status_log = StatusLog(structured=args.headless, path=args.status_log)
+if args.headless:
+    chatter_to_stderr() #stdout is left to the JSON status lines
+
+# === Initialize Whisper ===
+#loads in the background while the glasses connect; wake word and questions share this one model.
+#backend (whisper or faster-whisper int8), model size and threads are set in stt.py or ARIA_STT_* env vars
+stt.preload()
 
 # === Optional WiFi Device Setup ===
 if args.interface == "wifi":
@@ -199,7 +202,7 @@ config.security_options = options
 streaming_client.subscription_config = config
 
 # === Observer & Streaming Start ===
-observer = StreamingObserver()
+observer = StreamingObserver(idle_fps=args.idle_fps)
 
 # === Initialize text to speech queue and worker ===
 def tts_worker():
@@ -225,8 +228,8 @@ streaming_client.subscribe()
 print("Connected to Aria. Streaming started.")
 
 # === OpenCV Display Loop ===
-cv2.namedWindow("Aria RGB + LLaVA Caption", cv2.WINDOW_NORMAL)
-cv2.resizeWindow("Aria RGB + LLaVA Caption", 640, 480)
+#no window (and no per-frame rendering at all) in headless mode
+display = None if args.headless else FrameDisplay(observer.frames, "Aria RGB + LLaVA Caption")
 
 # === Launch user input thread for follow-up questions ===
 def follow_up_input_loop(observer: StreamingObserver):
@@ -250,8 +253,8 @@ def follow_up_input_loop(observer: StreamingObserver):
                 time.sleep(0.1) #pause for speakers to stop
 
                 #record & transcribe question
-                audio, rate = record_audio(duration=4)
-                question = transcribe_audio(audio, rate)
+                recording, rate = record_audio()
+                question = transcribe_audio(recording, rate)
                 print(f'You said: "{question}"')
                 log_event(f"Question: {question}")
 
@@ -261,7 +264,7 @@ def follow_up_input_loop(observer: StreamingObserver):
                 
                 #Captions image 
                 if question.lower() in ["caption", "describe", "what's around me"]:
-                    caption = observer.generate_caption(observer.last_image)
+                    caption = observer.caption_latest()
                     print(f"\nLLaVA caption: {caption}")
                     log_event(f"Caption: {caption}")
                     speak_text(caption, current_audio_output_device)
@@ -297,74 +300,100 @@ def follow_up_input_loop(observer: StreamingObserver):
         tts_queue.put(None)
         sys.exit(0)
 
-def follow_up_on_wake(observer: StreamingObserver):
-    while True:
-        wake_word.wait_for_wake_word(stt_model)
-        log_event("Wake word detected.")
-
-        observer.caption_pause = True
-        stop_current_tts()
-        time.sleep(0.1)
-
-        print("Listening for your question...")
-        audio, rate = record_audio(duration=4)
-        question = transcribe_audio(audio, rate)
-        print(f'You asked: "{question}"')
-        log_event(f"Question: {question}")
-
-        #Captions image 
-        if question.lower() in ["caption", "describe", "what's around me"]:
-            caption_time = time.time()
-            caption = observer.generate_caption(observer.last_image)
-            #print(f"\nLLaVA caption: {caption}")
-            log_event(f"Caption: {caption}")
-            print(f"Cpation Time: {time.time()-caption_time}")
+CAPTION_WORDS = ["caption", "describe", "what's around me"]
+request_lock = threading.Lock() #one spoken/typed/control request at a time
+
+def handle_question(question):
+    #captions or answers one request and speaks the result; returns what was said
+    with request_lock:
+        start = time.time()
+        if question.lower() in CAPTION_WORDS:
+            caption = observer.caption_latest()
+            observer.caption = observer.last_caption = caption
+            log_event(f"Caption ({time.time()-start:.2f}s): {caption}", event="caption",
+                      text=caption, seconds=round(time.time()-start, 3))
             speak_text(caption, current_audio_output_device)
-            observer.caption_pause = False
-            
-            continue
-
-        if question:
-            question_time = time.time()
-            answer = observer.ask_follow_up(question)
-            log_event(f"Answer: {answer}")
-            print(f"Question Time: {time.time()-question_time}")
-            speak_text(answer, current_audio_output_device)
-            
+            return caption
+
+        answer = observer.ask_follow_up(question)
+        log_event(f"Answer ({time.time()-start:.2f}s): {answer}", event="answer",
+                  question=question, text=answer, seconds=round(time.time()-start, 3))
+        speak_text(answer, current_audio_output_device)
+        return answer
+
+def listen_and_answer():
+    observer.caption_pause = True
+    stop_current_tts()
+    time.sleep(0.1)
+    try:
+        #full frame rate while the question is recorded, so fresh frames are waiting when it is answered
+        with observer.capture.active():
+            print("Listening for your question...")
+            recording, rate = record_audio()
+            question = transcribe_audio(recording, rate)
+            log_event(f"Question: {question}", event="question", text=question)
+            return handle_question(question) if question else None
+    finally:
         observer.caption_pause = False
+
+def follow_up_on_wake(observer: StreamingObserver):
+    while True:
+        wake_word.wait_for_wake_word()
+        log_event("Wake word detected.", event="wake")
+        listen_and_answer()
         time.sleep(0.5)  # prevent retriggering
 
 wake_thread = threading.Thread(target=follow_up_on_wake, args=(observer,), daemon=True)
 wake_thread.start()
 
+# === Headless control ===
+stop_event = threading.Event()
+control = None
+
+def status_snapshot():
+    return {
+        'frames': observer.frames.stats(),
+        'capture': observer.capture.stats(),
+        'microphone': shared_stream().stats(),
+        'stt': stt.stats(),
+        'last_caption': observer.last_caption,
+        'caption_server': caption_client.server,
+        'timings': caption_client.timings,
+    }
+
+if args.headless:
+    control = ControlServer(args.control_socket)
+    control.command("caption", lambda _: handle_question("caption"))
+    control.command("ask", lambda question: handle_question(question) if question else "Nothing asked.")
+    control.command("listen", lambda _: listen_and_answer())
+    control.command("status", lambda _: status_snapshot())
+    control.command("quit", lambda _: stop_event.set() or "Stopping.")
+    control.start()
+    for sig, name in SIGNAL_COMMANDS.items():
+        signal.signal(sig, lambda signum, frame, name=name: control.dispatch_in_background(name))
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    log_event(f"Running headless, control socket {args.control_socket}", event="started",
+              control_socket=args.control_socket, pid=os.getpid())
+
 try:
-    while True:
-        if observer.last_image is not None:
-            frame = cv2.cvtColor(observer.last_image, cv2.COLOR_RGB2BGR)
-            #display caption in window
-            caption_display = observer.caption[:80] + "..." if len(observer.caption) > 80 else observer.caption
-            cv2.putText(
-                frame,
-                caption_display,
-                (30, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (255, 255, 255),
-                2,
-                cv2.LINE_AA,
-            )
-            cv2.imshow("Aria RGB + LLaVA Caption", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-        
-        time.sleep(0.01)#sleep for 10ms
+    if args.headless:
+        while not stop_event.wait(STATUS_INTERVAL):
+            log_event("Status", event="status", **status_snapshot())
+    else:
+        while True:
+            display.render(observer.caption)
+            if display.poll_key() == ord("q"):
+                break
 
 except KeyboardInterrupt:
     print("\nInterrupted by user.")
 finally:
+    if control is not None:
+        control.stop()
     streaming_client.unsubscribe()
     stop_current_tts()   # Stops current tts
     tts_queue.put(None)  # Signal TTS thread to exit
     tts_thread.join()    # Wait for TTS thread to finish
-    cv2.destroyAllWindows()
+    if display is not None:
+        cv2.destroyAllWindows()
     print("Exiting.")
\ No newline at end of file
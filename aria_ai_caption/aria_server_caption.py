@@ -2,204 +2,159 @@
 # for aria glasses, text to speech, q&a, and wake word.
 # q&a requests can be also triggered on terminal by pressing "t" or speech can be prompeted
 # by pressing "s"
+# --headless runs without the window or terminal prompts; control it with signals or the
+# control socket (see headless.py)
 
-import cv2, argparse, time, io, threading, requests, queue, os, sys, warnings
+import cv2, argparse, time, threading, os, warnings
+import asyncio, signal
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from PIL import Image
-from ollama import Client
 import aria.sdk as aria
 from projectaria_tools.core.sensor_data import ImageDataRecord
 from datetime import datetime
 import traceback
 
 #speech to text imports
-import whisper
-import sounddevice as sd
-import tempfile, subprocess
-import scipy.io.wavfile as wavfile
+import stt #make sure stt.py is in same folder
 
 #Wake word inputs
 import wake_word #make sure wake_word.py is in same folder
+import audio #make sure audio.py is in same folder
+from audio_stream import shared_stream
+from vad import record_utterance
+from frame_buffer import FrameRingBuffer
+from display import FrameDisplay
+from caption_client import CaptionClient
+from scene_change import SceneChangeDetector
+from frame_quality import sharpest_frame
+from preprocess import FOLLOW_UP_SIZE
+from motion_state import MotionStateEstimator
+from headless import StatusLog, ControlServer, SIGNAL_COMMANDS, STATUS_INTERVAL, chatter_to_stderr, add_arguments as add_headless_arguments
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 
-# === Initialize Ollama client ===
-print("Connecting to Ollama...")
-client = Client()
-print("LLaVA (Ollama) client initialized.")
 
-# === Initialize Whisper ===
-#Change to faster-whisper foe faster CPU transcription?
-print("Loading Whisper model...")
-stt_model = whisper.load_model("base", device = "cpu") # also can pick "tiny", "base", "small", and "medium"
-print("Whisper loaded.")
-
-#Variables for tts interruption
-tts_queue = queue.Queue()
-tts_lock  = threading.Lock()
-current_tts_proc = None 
+# === Caption server ===
+CAPTION_SERVER = "http://127.0.0.1:8000" #change to your caption server address
+caption_client = CaptionClient(CAPTION_SERVER, caption_timeout=4)
+MAX_QUESTION_SECONDS = 10 #longest spoken question; shorter ones end on silence
 
-def record_audio(duration=4, fs=16000):
+def record_audio(max_duration=MAX_QUESTION_SECONDS):
+    #one spoken question from the always-on mic stream, ended by trailing silence (vad.py)
+    mic = shared_stream()
     print("Listening...")
-    recording = sd.rec(int(duration * fs), samplerate=fs,
-                    channels=1, dtype="int16")
-    sd.wait()
-    print("Recording finished.")
-    return recording, fs
+    recording, info = record_utterance(mic, max_seconds=max_duration)
+    print(f"Recording finished ({info['reason']}, {info['seconds']:.1f}s of audio).")
+    return recording, mic.fs
 
 def transcribe_audio(recording, fs):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-        wavfile.write(f.name, fs, recording)
-        print("Transcribing...")
-        result = stt_model.transcribe(f.name, fp16=False)
-    os.remove(f.name)
-    return result["text"].strip()
-
-def stop_current_tts(): #interrupts speech and empty the queue
-    global current_tts_proc
-    with tts_lock:
-        if current_tts_proc and current_tts_proc.poll() is None:
-            current_tts_proc.terminate()   #or .kill() for immediate stop
-        current_tts_proc = None
-        #flush anything that was still in line
-        while not tts_queue.empty():
-            try:
-                tts_queue.get_nowait()
-            except queue.Empty:
-                break
+    #straight from memory, no temp wav or ffmpeg process
+    print("Transcribing...")
+    return audio.transcribe(stt.get_model(), recording, fs, fp16=False)
+
+def listen_for_question():
+    recording, fs = record_audio()
+    return transcribe_audio(recording, fs)
+
+status_log = StatusLog() #replaced with a JSON lines log in headless mode
 
-def log_event(message, logfile="wake_log.txt"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}]  {message}")
-    #Uncomment following if you want datalog txt
-    #with open(logfile, "a") as f:
-    #    f.write(f"[{timestamp}] {message}\n")
+def log_event(message, event="log", **fields):
+    #fields only show up in the JSON lines of headless mode
+    status_log.emit(event, message, **fields)
+    #use --status-log FILE if you want a datalog file
 
 # === Streaming Observer Class ===
+# sdk callbacks run on the sdk's threads: they only store data and wake the event loop
 class StreamingObserver:
     def __init__(self):
-        self.last_image = None
+        self.frames = FrameRingBuffer() #last few rgb frames, written by the sdk callback
         self.last_caption_time = 0
-        self.cooldown = 10  # seconds between captions
+        #a new caption only when the view changed since the last one (or it is 30s old)
+        self.scene = SceneChangeDetector(min_interval=2, max_interval=30)
+        self.sharpest_wait = 0.3 #seconds to wait for a sharper frame before captioning
+        self.motion = MotionStateEstimator() #head motion from the imu stream
+        self.motion_wait = 2.0 #max seconds a requested caption waits for the head to stop moving
+        self.frame_wait = 5.0 #max seconds a requested caption waits for the first frame
         self.caption = "Waiting for image..."
-        self.caption_in_progress = False
         self.last_caption = ""
-        self.tts_in_progress = False
-        self.caption_pause = False
-        self.should_caption = False
         self.caption_timestamp = None
         self.processing_times = {
             'image_processing': 0,
             'model_inference': 0,
+            'frame_selection': 0,
             'total': 0
         }
-        self.frame_count = 0
-        self.last_frame_time = time.time()
-        self.target_fps = 10  # Balanced FPS for smooth display
+        self.loop = None #event loop to notify about new frames, set by Assistant.run
+        self.new_frame = None #asyncio.Event on that loop
+
+    def attach(self, loop, new_frame):
+        self.loop = loop
+        self.new_frame = new_frame
 
     def on_image_received(self, image: np.ndarray, record: ImageDataRecord):
         if record.camera_id == aria.CameraId.Rgb:
-            self.last_image = np.rot90(image, -1)
-            if self.should_caption:
-                self.maybe_caption()
-
-    def maybe_caption(self):
-        now = time.time()
-        if (
-            self.last_image is not None
-            and not self.caption_pause
-            and not self.caption_in_progress
-            and not self.tts_in_progress
-            and now - self.last_caption_time >= self.cooldown
-        ):
-            print("Triggering captioning...")
-            self.caption_in_progress = True
-            self.last_caption_time = now
-            threading.Thread(
-                target=self._caption_worker, args=(self.last_image.copy(),)
-            ).start()
-
-    def _caption_worker(self, image):
-        try:
-            start_time = time.time()
-            
-            # Image processing
-            img_start = time.time()
-            image = Image.fromarray(image).convert("RGB")
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
-            self.processing_times['image_processing'] = time.time() - img_start
-            
-            # Model inference
-            model_start = time.time()
-            caption = self.generate_caption(image)
-            self.processing_times['model_inference'] = time.time() - model_start
-            
-            # Total time
-            self.processing_times['total'] = time.time() - start_time
-
-            self.caption = caption
-            self.last_caption = caption
-            self.caption_timestamp = datetime.now()
-            
-            print(f"\nCaption: {caption}")
-            print(f"Total latency: {self.processing_times['total']:.2f}s\n")
-            
-            tts_queue.put(caption)
-        except Exception as e:
-            print(f"Error in caption worker: {e}")
-        finally:
-            self.caption_in_progress = False
-            self.should_caption = False
+            self.frames.write(image, record.capture_timestamp_ns)
+            if self.loop is not None:
+                try:
+                    self.loop.call_soon_threadsafe(self.new_frame.set)
+                except RuntimeError:
+                    pass #loop closed between frames, we are exiting
+
+    def on_imu_received(self, samples, imu_idx: int):
+        self.motion.update(samples, imu_idx)
+
+    def caption_sharpest(self):
+        #blocking: pick the sharpest of the next few frames and caption it. runs on the caption executor.
+        #returns the caption, or None if there was no frame or the server dropped it
+        start_time = time.time()
+
+        #best of the next few frames, so head motion blur doesn't end up in the caption
+        frame, sharpness = sharpest_frame(self.frames, wait_budget=self.sharpest_wait)
+        if frame is None:
+            return None
+        self.processing_times['frame_selection'] = time.time() - start_time
+        print(f"Captioning frame {frame.seq} (sharpness {sharpness:.0f})")
+
+        caption = self.generate_caption(frame.image)
+        timings = caption_client.timings.get('caption', {})
+        self.processing_times['image_processing'] = timings.get('resize', 0) + timings.get('encode', 0)
+        self.processing_times['model_inference'] = timings.get('request', 0)
+        if caption is None:
+            self.scene.reset() #nothing was said about this frame, don't count it as captioned
+            return None
+
+        # Total time
+        self.processing_times['total'] = time.time() - start_time
+
+        self.caption = caption
+        self.last_caption = caption
+        self.last_caption_time = time.time()
+        self.caption_timestamp = datetime.now()
+
+        log_event(f"Caption ({self.processing_times['total']:.2f}s): {caption}", event="caption",
+                  text=caption, frame=frame.seq, sharpness=round(sharpness, 1),
+                  **{stage: round(seconds, 3) for stage, seconds in self.processing_times.items()})
+        return caption
 
     def generate_caption(self, np_img: np.ndarray) -> str:
+        #None if the server dropped it for a newer frame or the request failed; an error message
+        #must never become last_caption, or an unchanged scene would keep repeating it
         try:
-            image = Image.fromarray(np_img).convert("RGB")
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
-
-            files = {'image': ('frame.png', buffer, 'image/png')}
-            response = requests.post(
-                "http://127.0.0.1:8000/caption",
-                files=files,
-                timeout=4
-            )
-
-            if response.status_code == 200:
-                caption = response.json().get("caption", "No caption received.")
-                return caption.strip()
-            else:
-                return f"Server error: {response.status_code}"
-        
+            return caption_client.caption(np_img)
         except Exception as e:
-            print(f"Error generating caption: {e}")
-            return "Error generating caption"
+            log_event(f"Error generating caption: {e}", event="error", stage="caption")
+            return None
 
     def ask_follow_up(self, question: str) -> str:
-        if self.last_image is None:
-            return "No image available yet for follow-up."
-
         try:
-            qa_start = time.time()
-            image = Image.fromarray(self.last_image).convert("RGB").resize((256, 256))
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
-
-            files = {'image': ('frame.png', buffer, 'image/png')}
-            data = {'question': question}
-
-            response = requests.post("http://127.0.0.1:8000/follow_up", files=files, data=data)
-            qa_duration = time.time() - qa_start
-
-            if response.status_code == 200:
-                answer = response.json().get("answer", "No answer returned.")
-                print(f"Q&A latency: {qa_duration:.2f} seconds")
-                return answer
-            else:
-                return f"Server error: {response.status_code} - {response.text}"
+            #the last captioned frame is reused on the server if it is recent, otherwise the newest frame is uploaded
+            with self.frames.view() as frame:
+                answer = caption_client.follow_up(question, frame.level(FOLLOW_UP_SIZE) if frame is not None else None)
+            if answer is None:
+                return "No image available yet for follow-up."
+            timings = caption_client.timings['follow_up']
+            print(f"Q&A latency{' (reused frame)' if timings['reused_frame'] else ''}: {timings['total']:.2f} seconds")
+            return answer
         except Exception as e:
             return f"Exception during follow-up: {e}"
 
@@ -212,7 +167,16 @@ parser.add_argument(
     choices=["usb", "wifi"],
     help="Connection type: usb or wifi",
 )
+add_headless_arguments(parser)
 args = parser.parse_args()
+status_log = StatusLog(structured=args.headless, path=args.status_log)
+if args.headless:
+    chatter_to_stderr() #stdout is left to the JSON status lines
+
+# === Initialize Whisper ===
+#loads in the background while the glasses connect; wake word and questions share this one model.
+#backend (whisper or faster-whisper int8), model size and threads are set in stt.py or ARIA_STT_* env vars
+stt.preload()
 
 # === Optional WiFi Device Setup ===
 if args.interface == "wifi":
@@ -234,7 +198,7 @@ print("Initializing Aria streaming client...")
 aria.set_log_level(aria.Level.Info)
 streaming_client = aria.StreamingClient()
 config = streaming_client.subscription_config
-config.subscriber_data_type = aria.StreamingDataType.Rgb
+config.subscriber_data_type = aria.StreamingDataType.Rgb | aria.StreamingDataType.Imu #imu drives caption timing
 config.message_queue_size[aria.StreamingDataType.Rgb] = 1
 options = aria.StreamingSecurityOptions()
 options.use_ephemeral_certs = True
@@ -243,167 +207,349 @@ streaming_client.subscription_config = config
 
 # === Observer & Streaming Start ===
 observer = StreamingObserver()
-
-# === Initialize text to speech queue and worker ===
-def tts_worker():
-    global current_tts_proc
-    while True:
-        text = tts_queue.get()
-        if text is None:# shutdown signal
-            break
-        try:
-            observer.tts_in_progress = True #flag on 
-            # launch `say` non-blocking:
-            cmd = ["say", text]
-            with tts_lock:
-                current_tts_proc = subprocess.Popen(cmd)
-            current_tts_proc.wait()#block until done or killed
-        except Exception as e:
-            print("TTS error:", e)
-        finally:
-            with tts_lock:
-                current_tts_proc = None
-            observer.tts_in_progress = False #flag off 
-            tts_queue.task_done()
-
-tts_thread = threading.Thread(target=tts_worker, daemon=True)
-tts_thread.start()
-
 streaming_client.set_streaming_client_observer(observer)
 streaming_client.subscribe()
 print("Connected to Aria. Streaming started.")
 
-# === Launch user input thread for follow-up questions ===
-def follow_up_input_loop(observer: StreamingObserver):
-    try:
+# === Runtime ===
+# Everything below runs on one asyncio event loop. Captions and questions take turns through
+# one lock, speech goes through a bounded queue, and nothing polls flags. Blocking work runs on
+# small executors: one thread for recording and transcribing questions and two for caption server
+# calls. The whisper model is shared with the wake word listener, stt serializes the transcriptions.
+# Calls that may never return (stdin, the wake word listener) get daemon threads so exit isn't held up.
+SPEECH_QUEUE_SIZE = 4 #pending utterances, the oldest is dropped past this
+
+def in_daemon_thread(fn, *args):
+    #awaitable result of a blocking call made on a throwaway daemon thread
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def runner():
+        result, error = None, None
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            pass #loop already closed, we are exiting
+    threading.Thread(target=runner, daemon=True).start()
+    return future
+
+
+class Speaker:
+    #text to speech with macOS `say`, one utterance at a time
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=SPEECH_QUEUE_SIZE)
+        self.idle = asyncio.Event() #set when nothing is being said or waiting to be said
+        self.idle.set()
+        self.speaking = False #an utterance was taken off the queue and hasn't finished, even if `say` hasn't started yet
+        self.generation = 0 #bumped by interrupt(); an utterance from an older generation is stopped
+        self.proc = None
+
+    def say(self, text):
+        if self.queue.full():
+            self.queue.get_nowait() #stale by now
+        self.queue.put_nowait(text)
+        self.idle.clear()
+
+    def interrupt(self):
+        #stops the current utterance (or the one about to start) and drops everything queued
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.generation += 1
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.terminate()
+        if not self.speaking:
+            self.idle.set() #otherwise _speak sets it once the utterance has stopped
+
+    async def say_now(self, text):
+        #interrupts whatever is playing and returns once text has been spoken
+        self.interrupt()
+        await self.idle.wait()
+        self.speaking = True
+        await self._speak(text, self.generation)
+
+    async def run(self):
         while True:
-            # ------- choose input mode -------
-            mode = input("\n[t]ype or [s]peak a follow-up (exit = q): ").strip().lower()
-            if mode == "q":
-                print("Exiting follow-up loop.")
-                sys.exit(0)
-
-            if mode == "t":
-                question = input("Your question: ").strip()
-                if not question:
-                    continue
-
-            elif mode == "s":
-                #pause captioning and stop tts
-                observer.caption_pause = True
-                stop_current_tts()
-                time.sleep(0.1) #pause for speakers to stop
-
-                #record & transcribe question
-                audio, rate = record_audio(duration=4)
-                question = transcribe_audio(audio, rate)
-                print(f'You said: "{question}"')
-                if not question:
-                    observer.caption_pause = False
-                    continue
-
-                #ask LLaVA & speak the answer immediately
-                answer = observer.ask_follow_up(question)
-                print("\nLLaVA says:", answer, flush=True)
-
-                observer.tts_in_progress = True #block captions while we speak
-                stop_current_tts() #nothing should slip ahead in the queue
-                subprocess.call(["say", answer]) #synchronous, returns when done
-                observer.tts_in_progress = False
-                observer.caption_pause = False #resumes normal caption flow
-                continue
-            
-            else:
-                print("Enter t, s, or q.")
-                continue
-            # ------- send to LLaVA -------
-            answer = observer.ask_follow_up(question)
-            print("\nLLaVA says:", answer, flush=True)
-
-            # enqueue answer for speech after any caption
-            while observer.caption_in_progress:
-                time.sleep(0.05)
-            tts_queue.put(answer)
-
-    except (KeyboardInterrupt, EOFError):
-        print("\nStopping follow-up loop.")
-        stop_current_tts()
-        tts_queue.put(None)
-        sys.exit(0)
-
-def follow_up_on_wake(observer: StreamingObserver):
-    while True:
+            text = await self.queue.get()
+            self.speaking = True #same step as the dequeue, so interrupt() can't miss this utterance
+            await self._speak(text, self.generation)
+
+    async def _speak(self, text, generation):
+        self.idle.clear()
         try:
-            wake_word.wait_for_wake_word(stt_model)
-            log_event("Wake word detected.")
+            self.proc = await asyncio.create_subprocess_exec("say", text)
+            if generation != self.generation:
+                self.proc.terminate() #interrupted while `say` was starting
+            await self.proc.wait()
+        except asyncio.CancelledError:
+            if self.proc is not None and self.proc.returncode is None:
+                self.proc.terminate()
+            raise
+        except Exception as e:
+            print("TTS error:", e)
+        finally:
+            self.proc = None
+            self.speaking = False
+            if self.queue.empty():
+                self.idle.set()
+
+
+class Assistant:
+    def __init__(self, observer: StreamingObserver, headless=False, control_socket=None):
+        self.observer = observer
+        self.headless = headless #no display or stdin; control through signals and control_socket
+        self.control = ControlServer(control_socket) if headless else None
+        self.speaker = Speaker()
+        self.turn = asyncio.Lock() #held by a caption or a question from start to answer
+        self.caption_requests = asyncio.Queue(maxsize=1) #one pending caption request is enough
+        self.new_frame = asyncio.Event()
+        self.stop = asyncio.Event()
+        self.stt_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+        self.caption_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="caption")
+
+    def request_caption(self):
+        if not self.caption_requests.full():
+            self.caption_requests.put_nowait(time.time())
+
+    async def listen(self):
+        return await asyncio.get_running_loop().run_in_executor(self.stt_pool, listen_for_question)
+
+    async def answer(self, question):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.caption_pool, self.observer.ask_follow_up, question
+        )
+
+    async def caption_loop(self):
+        while True:
+            requested_at = await self.caption_requests.get()
+            await self.speaker.idle.wait() #don't talk over ourselves
+            async with self.turn:
+                try:
+                    await self.caption_once(requested_at)
+                except Exception as e:
+                    log_event(f"Error in caption worker: {e}", event="error", stage="caption")
+
+    async def caption_once(self, requested_at):
+        observer = self.observer
+        #wait for a frame, and for the head to stop turning (up to motion_wait)
+        while True:
+            has_frame = observer.frames.latest_seq()
+            if has_frame and not (observer.motion.is_moving() and time.time() - requested_at < observer.motion_wait):
+                break
+            if not has_frame and time.time() - requested_at > observer.frame_wait:
+                print("No image from the glasses yet, skipping caption")
+                return
+            self.new_frame.clear()
+            try:
+                await asyncio.wait_for(self.new_frame.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+        #head moved and settled since the last caption: describe the new view even if it looks similar
+        settled = observer.motion.consume_settled()
+        with observer.frames.view() as frame:
+            changed = frame is not None and observer.scene.check(frame.level(FOLLOW_UP_SIZE), force=settled)
+        if not changed:
+            if observer.last_caption:
+                #same scene as the last caption, say it again instead of running the model
+                print("Scene unchanged, repeating last caption")
+                self.speaker.say(observer.last_caption)
+            return
+
+        print(f"Triggering captioning ({observer.scene.last_reason})...")
+        caption = await asyncio.get_running_loop().run_in_executor(self.caption_pool, observer.caption_sharpest)
+        if caption is not None:
+            self.speaker.say(caption)
+
+    async def wake_loop(self):
+        while True:
+            await in_daemon_thread(wake_word.wait_for_wake_word)
+            log_event("Wake word detected.", event="wake")
+            try:
+                await self.listen_and_answer()
+            except Exception as e:
+                log_event(f"Error handling wake word question: {e}", event="error", stage="wake")
+
+    async def listen_and_answer(self):
+        #one spoken request: either "caption" or a question about the view
+        self.speaker.interrupt()
+        async with self.turn:
             print("Listening for your question...")
-            recording, fs = record_audio()
-            question = transcribe_audio(recording, fs)
-            print(f"You asked: \"{question}\"")
-            log_event(f"Question: {question}")
+            question = await self.listen()
+            log_event(f"Question: {question}", event="question", text=question)
 
             if "caption" in question.lower():
-                observer.should_caption = True  # Start captioning
+                self.request_caption() #runs once this turn is over
                 print("Starting captioning...")
-            else:
-                answer = observer.ask_follow_up(question)
-                print(f"LLaVA says: {answer}")
-                log_event(f"Answer: {answer}")
-                tts_queue.put(answer)
+                return "Caption requested."
+            if question:
+                return await self.answer_and_say(question)
+            return None
+
+    async def ask(self, question):
+        #typed or control socket question, answered in its turn and queued for speech
+        async with self.turn:
+            return await self.answer_and_say(question)
+
+    async def answer_and_say(self, question):
+        start = time.time()
+        answer = await self.answer(question)
+        log_event(f"LLaVA says: {answer}", event="answer", question=question, text=answer,
+                  seconds=round(time.time() - start, 3))
+        self.speaker.say(answer)
+        return answer
+
+    async def input_loop(self):
+        try:
+            while True:
+                # ------- choose input mode -------
+                mode = (await in_daemon_thread(input, "\n[t]ype or [s]peak a follow-up (exit = q): ")).strip().lower()
+                if mode == "q":
+                    print("Exiting follow-up loop.")
+                    self.stop.set()
+                    return
+
+                if mode == "t":
+                    question = (await in_daemon_thread(input, "Your question: ")).strip()
+                    if not question:
+                        continue
+                    #waits for a caption in progress to finish, then goes before the next one
+                    await self.ask(question)
+
+                elif mode == "s":
+                    async with self.turn: #captions wait until the answer has been spoken
+                        self.speaker.interrupt()
+                        await self.speaker.idle.wait() #speakers have stopped
+
+                        #record & transcribe question
+                        question = await self.listen()
+                        print(f'You said: "{question}"')
+                        if not question:
+                            continue
+
+                        #ask LLaVA & speak the answer immediately
+                        answer = await self.answer(question)
+                        print("\nLLaVA says:", answer, flush=True)
+                        await self.speaker.say_now(answer)
+
+                else:
+                    print("Enter t, s, or q.")
+        except (KeyboardInterrupt, EOFError):
+            print("\nStopping follow-up loop.")
+            self.stop.set()
+
+    async def display_loop(self):
+        # === OpenCV Display Loop ===
+        display = FrameDisplay(self.observer.frames, "Aria RGB + LLaVA Caption") #redraws only on new frames
+        while True:
+            display.render(self.observer.caption)
+            if display.poll_key(1) == ord("q"):
+                self.stop.set()
+                return
+            await asyncio.sleep(0.01)#sleep for 10ms
+
+    async def status_loop(self):
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            log_event("Status", event="status", **self.status())
+
+    def status(self):
+        return {
+            'frames': self.observer.frames.stats(),
+            'motion': self.observer.motion.stats(),
+            'microphone': shared_stream().stats(),
+            'stt': stt.stats(),
+            'last_caption': self.observer.last_caption,
+            'processing_times': self.observer.processing_times,
+            'speaking': not self.speaker.idle.is_set(),
+            'caption_server': caption_client.server,
+        }
 
-            time.sleep(0.1)  # prevent retriggering
-        except KeyboardInterrupt:
-            print("\nWake-word detection interrupted.")
-            sys.exit(0)
+    def start_control(self, loop):
+        #control socket commands run on the socket's threads and hand work to the loop
+        def on_loop(coro, timeout=120):
+            return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+        async def caption():
+            self.request_caption()
+            return "Caption requested."
+
+        async def status():
+            return self.status()
+
+        control = self.control
+        control.command("caption", lambda _: on_loop(caption()))
+        control.command("ask", lambda question: on_loop(self.ask(question)) if question else "Nothing asked.")
+        control.command("listen", lambda _: on_loop(self.listen_and_answer()))
+        control.command("status", lambda _: on_loop(status()))
+        control.command("quit", lambda _: loop.call_soon_threadsafe(self.stop.set) or "Stopping.")
+        control.start()
+        for sig, name in SIGNAL_COMMANDS.items():
+            loop.add_signal_handler(sig, control.dispatch_in_background, name)
+        log_event(f"Running headless, control socket {control.path}", event="started",
+                  control_socket=control.path, pid=os.getpid())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.observer.attach(loop, self.new_frame)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop.set)
+            except NotImplementedError:
+                pass #windows: ctrl-c still raises KeyboardInterrupt
+
+        tasks = [
+            asyncio.create_task(self.speaker.run(), name="tts"),
+            asyncio.create_task(self.caption_loop(), name="caption"),
+            asyncio.create_task(self.wake_loop(), name="wake word"),
+        ]
+        if self.headless:
+            self.start_control(loop)
+            tasks.append(asyncio.create_task(self.status_loop(), name="status"))
+        else:
+            tasks.append(asyncio.create_task(self.input_loop(), name="input"))
+            tasks.append(asyncio.create_task(self.display_loop(), name="display"))
+        stopped = asyncio.create_task(self.stop.wait())
+        try:
+            done, _ = await asyncio.wait(tasks + [stopped], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not stopped and not task.cancelled() and task.exception() is not None:
+                    error = task.exception()
+                    log_event(f"{task.get_name()} task failed: {error}", event="error", stage=task.get_name())
+                    traceback.print_exception(type(error), error, error.__traceback__)
+        finally:
+            print("\nShutting down...")
+            self.observer.loop = None
+            if self.control is not None:
+                self.control.stop()
+            self.speaker.interrupt()
+            for task in tasks + [stopped]:
+                task.cancel()
+            await asyncio.gather(*tasks, stopped, return_exceptions=True)
+            self.stt_pool.shutdown(wait=False, cancel_futures=True)
+            self.caption_pool.shutdown(wait=False, cancel_futures=True)
 
-wake_thread = threading.Thread(target=follow_up_on_wake, args=(observer,), daemon=True)
-wake_thread.start()
 
-# === OpenCV Display Loop ===
-cv2.namedWindow("Aria RGB + LLaVA Caption", cv2.WINDOW_NORMAL)
-cv2.resizeWindow("Aria RGB + LLaVA Caption", 640, 480)
+async def main():
+    await Assistant(observer, headless=args.headless, control_socket=args.control_socket).run()
 
 try:
-    while True:
-        if observer.last_image is not None:
-            frame = cv2.cvtColor(observer.last_image, cv2.COLOR_RGB2BGR)
-            #display caption in window
-            caption_display = observer.caption[:80] + "..." if len(observer.caption) > 80 else observer.caption
-            cv2.putText(
-                frame,
-                caption_display,
-                (30, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (255, 255, 255),
-                2,
-                cv2.LINE_AA,
-            )
-            cv2.imshow("Aria RGB + LLaVA Caption", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-        
-        time.sleep(0.01)#sleep for 10ms
-
+    asyncio.run(main())
 except KeyboardInterrupt:
     print("\nInterrupted by user.")
 finally:
     streaming_client.unsubscribe()
-    stop_current_tts()   # Stops current tts
-    tts_queue.put(None)  # Signal TTS thread to exit
-    tts_thread.join()    # Wait for TTS thread to finish
-    cv2.destroyAllWindows()
+    if not args.headless:
+        cv2.destroyAllWindows()
     print("Exiting.")
-
-# Add signal handlers for clean exit
-import signal
-
-def signal_handler(signum, frame):
-    print("\nReceived signal to exit. Cleaning up...")
-    if 'observer' in globals():
-        observer.cleanup()
-    sys.exit(0)
-
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
-
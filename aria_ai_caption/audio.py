@@ -0,0 +1,48 @@
+# In-memory audio for Whisper: recordings go to the model as float32 numpy arrays at 16 kHz
+# Passing a file path makes whisper start an ffmpeg process to decode and resample it, so every
+# 4 second wake word chunk used to cost a temp WAV write, an ffmpeg launch and a delete.
+# Whisper takes an array directly when it is mono float32 in [-1, 1] at 16 kHz; anything else
+# (int16 from sounddevice, stereo, 44.1/48/64 kHz mics) is converted here with numpy/scipy.
+#
+# Usage:
+#   recording = sd.rec(int(4 * fs), samplerate=fs, channels=1, dtype="int16"); sd.wait()
+#   text = audio.transcribe(stt_model, recording, fs)
+#   samples = audio.to_model_input(recording, fs)      #float32, mono, 16 kHz
+from math import gcd
+
+import numpy as np
+from scipy.signal import resample_poly
+
+SAMPLE_RATE = 16000 #what whisper expects (whisper.audio.SAMPLE_RATE)
+
+
+def to_float32(audio):
+    #int16/int32/float recording, (n,) or (n, channels) -> mono float32 in [-1, 1]
+    audio = np.asarray(audio)
+    if audio.ndim == 2:
+        audio = audio[:, 0] if audio.shape[1] == 1 else audio.mean(axis=1)
+    if np.issubdtype(audio.dtype, np.integer):
+        scale = float(np.iinfo(audio.dtype).max) + 1.0
+        return audio.astype(np.float32) / scale
+    return audio.astype(np.float32, copy=False)
+
+
+def resample(audio, fs, target=SAMPLE_RATE):
+    #polyphase resampling (low pass filtered, so no aliasing), e.g. 48000 -> 16000 is up 1 / down 3
+    if fs == target:
+        return audio
+    divisor = gcd(int(fs), int(target))
+    return resample_poly(audio, target // divisor, int(fs) // divisor).astype(np.float32, copy=False)
+
+
+def to_model_input(audio, fs):
+    #recording -> contiguous mono float32 at 16 kHz, what whisper's transcribe() takes in place of a path
+    return np.ascontiguousarray(resample(to_float32(audio), fs))
+
+
+def transcribe(model, audio, fs, **options):
+    #options go to model.transcribe, e.g. fp16=False on cpu. nothing recorded = nothing said
+    if not len(audio):
+        return ""
+    result = model.transcribe(to_model_input(audio, fs), **options)
+    return result["text"].strip()
@@ -0,0 +1,183 @@
+# Continuous microphone capture into a preallocated ring buffer
+# sd.rec + sd.wait recorded fixed windows back to back, so the mic was deaf while whisper ran and
+# a wake phrase that straddled two windows was heard by neither. Here one InputStream runs for the
+# whole session and its callback (portaudio's thread) copies each block into a ring of float32
+# samples at 16 kHz. Readers address audio by absolute sample index / time and read overlapping
+# sliding windows out of the ring; nothing blocks the callback.
+#
+# Lock-free: there is one writer, which copies a block and only then advances `written`.
+# A reader copies its range and then checks `written` again; if the writer lapped it meanwhile,
+# the overwritten part is dropped and counted.
+#
+#   overruns - blocks portaudio reported as input overflow (audio lost before it reached us)
+#   dropped  - samples a reader asked for that were already overwritten (reader too slow)
+#
+# Usage:
+#   mic = shared_stream()                                   #started on first use
+#   for start, samples in mic.windows(3.0, 1.0):            #3 s windows every 1 s, newest first if behind
+#       ...
+#   samples = mic.record(4.0)                               #the next 4 seconds
+import threading
+import time
+
+import numpy as np
+import sounddevice as sd
+
+SAMPLE_RATE = 16000   #whisper's rate, so windows go to the model without resampling
+RING_SECONDS = 30.0   #audio kept; readers further behind than this lose samples
+BLOCK_SECONDS = 0.05  #portaudio callback block size (also the readers' polling interval)
+
+
+class AudioRingBuffer:
+    def __init__(self, seconds=RING_SECONDS, fs=SAMPLE_RATE):
+        self.fs = fs
+        self.capacity = int(seconds * fs)
+        self.written = 0  #total samples ever written = index of the next sample
+        self.overruns = 0
+        self.dropped = 0
+        self._ring = np.zeros(self.capacity, dtype=np.float32)
+        self._anchor = (0, time.monotonic()) #(sample index, monotonic time of that sample)
+
+    def write(self, samples, capture_time=None):
+        #single writer only. samples: 1d float32
+        n = len(samples)
+        if n > self.capacity:
+            samples, n = samples[-self.capacity:], self.capacity
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._ring[start:start + first] = samples[:first]
+        if first < n:
+            self._ring[:n - first] = samples[first:]
+        if capture_time is not None:
+            self._anchor = (self.written, capture_time)
+        self.written += n #publish after the copy, readers never see a half written block
+
+    def index_at(self, t):
+        #sample index captured at monotonic time t
+        index, anchor_time = self._anchor
+        return index + int(round((t - anchor_time) * self.fs))
+
+    def time_of(self, index):
+        anchor_index, anchor_time = self._anchor
+        return anchor_time + (index - anchor_index) / self.fs
+
+    def read(self, start, end):
+        #copy of samples [start, end) that are still in the ring; may start later than asked
+        end = min(end, self.written)
+        oldest = self.written - self.capacity
+        if start < oldest:
+            self.dropped += oldest - start
+            start = oldest
+        if end <= start:
+            return np.zeros(0, dtype=np.float32), start
+        i, j = start % self.capacity, end % self.capacity
+        if i < j:
+            samples = self._ring[i:j].copy()
+        else:
+            samples = np.concatenate((self._ring[i:], self._ring[:j]))
+
+        #the writer may have lapped us during the copy; cut off what it overwrote
+        oldest = self.written - self.capacity
+        if start < oldest:
+            lost = min(oldest - start, len(samples))
+            self.dropped += lost
+            samples, start = samples[lost:], start + lost
+        return samples, start
+
+    def wait_until(self, index, timeout=None):
+        #poll until sample index has been written; returns False on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.written < index:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(BLOCK_SECONDS)
+        return True
+
+    def stats(self):
+        return {
+            'seconds_captured': round(self.written / self.fs, 1),
+            'overruns': self.overruns,
+            'dropped_seconds': round(self.dropped / self.fs, 3),
+        }
+
+
+class MicrophoneStream(AudioRingBuffer):
+    def __init__(self, seconds=RING_SECONDS, fs=SAMPLE_RATE, device=None):
+        super().__init__(seconds, fs)
+        self.device = device
+        self.late_windows = 0 #windows skipped because the consumer fell behind
+        self._stream = None
+
+    def start(self):
+        if self._stream is None:
+            self._stream = sd.InputStream(samplerate=self.fs, channels=1, dtype="float32", device=self.device,
+                                          blocksize=int(BLOCK_SECONDS * self.fs), callback=self._callback)
+            self._stream.start()
+        return self
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _callback(self, indata, frames, time_info, status):
+        #portaudio thread: no locks, no allocation beyond the copy into the ring
+        if status.input_overflow:
+            self.overruns += 1
+        #time of the first sample in the block, on time.monotonic's clock
+        capture_time = time.monotonic() - frames / self.fs
+        self.write(indata[:, 0], capture_time)
+
+    def record(self, seconds, start=None):
+        #the next `seconds` of audio (from start, default now), waits for it to be captured
+        start = self.written if start is None else start
+        end = start + int(seconds * self.fs)
+        self.wait_until(end)
+        samples, _ = self.read(start, end)
+        return samples
+
+    def latest(self, seconds):
+        #the most recent `seconds` of audio already captured
+        end = self.written
+        samples, _ = self.read(end - int(seconds * self.fs), end)
+        return samples
+
+    def windows(self, window_seconds, hop_seconds, start=None):
+        #endless overlapping windows (start index, samples), each hop_seconds after the last.
+        #a consumer slower than the hop skips ahead to the newest complete window, so it stays live
+        window, hop = int(window_seconds * self.fs), int(hop_seconds * self.fs)
+        start = self.written if start is None else start
+        while True:
+            self.wait_until(start + window)
+            newest = self.written - window
+            if newest - start >= hop:
+                self.late_windows += (newest - start) // hop
+                start += (newest - start) // hop * hop
+            samples, first = self.read(start, start + window)
+            yield first, samples
+            start += hop
+
+    def stats(self):
+        stats = super().stats()
+        stats['late_windows'] = self.late_windows
+        return stats
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_stream():
+    #one microphone stream per process, shared by wake word detection and question recording
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MicrophoneStream().start()
+        return _shared
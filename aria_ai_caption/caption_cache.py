@@ -0,0 +1,94 @@
+# Caption cache for caption_server.py
+# Frames are keyed by a perceptual difference hash (dHash) so near identical frames
+# (wearer standing still) reuse the stored caption instead of running llava again.
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+HASH_SIZE = 8 #8x8 = 64 bit hash
+
+def dhash(image: Image.Image, hash_size=HASH_SIZE) -> int:
+    #jpeg can be decoded at a reduced scale, way cheaper than a full decode
+    if image.format == "JPEG":
+        image.draft("L", (hash_size * 8, hash_size * 8))
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+
+    #each bit = is this pixel brighter than its right neighbour
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class CaptionCache:
+    def __init__(self, capacity=256, ttl=30.0, max_distance=4):
+        self.capacity = capacity #max entries before least recently used is evicted
+        self.ttl = ttl #seconds an entry stays valid
+        self.max_distance = max_distance #hamming distance still counted as the same frame
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() #(hash, prompt, model) -> (text, stored_at)
+        self._lock = threading.Lock()
+
+    def get(self, frame_hash, prompt, model):
+        return self.lookup(frame_hash, prompt, (model,))[0]
+
+    def lookup(self, frame_hash, prompt, models):
+        #any of several models will do (e.g. every model a backend pool serves); returns
+        #(text, model it came from) or (None, None). exact matches go by the order of models
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            key = next((k for k in ((frame_hash, prompt, m) for m in models) if k in self._entries), None)
+            if key is None:
+                #no exact match, look for a near duplicate with the same prompt and one of the models
+                best = self.max_distance + 1
+                for other in self._entries:
+                    if other[1] != prompt or other[2] not in models:
+                        continue
+                    distance = hamming(frame_hash, other[0])
+                    if distance < best:
+                        key, best = other, distance
+
+            if key is None:
+                self.misses += 1
+                return None, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0], key[2]
+
+    def put(self, frame_hash, prompt, model, text):
+        with self._lock:
+            key = (frame_hash, prompt, model)
+            self._entries[key] = (text, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries),
+                'capacity': self.capacity,
+                'ttl': self.ttl,
+                'max_distance': self.max_distance,
+            }
+
+    def _expire(self, now):
+        #entries are in insertion/use order, but ttl counts from when they were stored
+        expired = [k for k, (_, stored_at) in self._entries.items() if now - stored_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
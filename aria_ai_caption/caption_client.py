@@ -0,0 +1,155 @@
+# HTTP client for caption_server.py, shared by aria_server.py, aria_server_caption.py and llava_laptop.py
+# One keep-alive connection pool for every call. Frames are downscaled to the size the model
+# actually sees and encoded once as JPEG (or WebP) before upload instead of a full-size PNG.
+# Follow-ups about a just-captioned frame send its frame_id rather than the image.
+#
+# Usage:
+#   caption_client = CaptionClient("http://127.0.0.1:8000")
+#   caption = caption_client.caption(frame.level(CAPTION_SIZE))   #None if the server dropped it for a newer frame
+#   answer = caption_client.follow_up("what is on the table?", frame.level(FOLLOW_UP_SIZE))
+#   print(caption_client.timings['caption'])            #per stage seconds of the last call
+import threading
+import time
+
+import cv2
+import requests
+from requests.adapters import HTTPAdapter
+
+# sizes the server's model sees; uploading exactly these lets the server skip its own resize,
+# and passing the matching pyramid level (frame.level(size)) lets encode() skip this one
+from preprocess import CAPTION_SIZE, FOLLOW_UP_SIZE
+
+IMAGE_FORMAT = "jpeg" #"jpeg" or "webp" (webp is smaller but the server has to re-encode it for ollama)
+IMAGE_QUALITY = 85    #0-100 for both formats
+FRAME_REUSE_SECONDS = 10 #follow-ups within this long after a caption reuse that frame on the server
+CONNECT_TIMEOUT = 3.05
+
+ENCODINGS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+class CaptionServerError(Exception):
+    def __init__(self, status_code, text):
+        super().__init__(f"Server error: {status_code} - {text}")
+        self.status_code = status_code
+
+
+class CaptionClient:
+    def __init__(self, server, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY,
+                 caption_timeout=10, follow_up_timeout=30, pool_size=4):
+        if image_format not in ENCODINGS:
+            raise ValueError(f"Unsupported image format {image_format!r}, use one of {sorted(ENCODINGS)}")
+        self.server = server.rstrip("/")
+        self.image_format = image_format
+        self.quality = quality
+        self.caption_timeout = caption_timeout
+        self.follow_up_timeout = follow_up_timeout
+
+        #caption worker and follow-up threads share the pool, so size it for both
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.frame_id = None #server side id of the last captioned frame
+        self.frame_id_time = 0
+        self.timings = {} #call name -> per stage seconds of its last run
+        self._lock = threading.Lock()
+
+    def encode(self, image, size):
+        #rgb numpy frame -> (bytes, mimetype) at the model's size; the only encode a frame gets
+        start = time.perf_counter()
+        if image.shape[1] != size[0] or image.shape[0] != size[1]:
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        resized = time.perf_counter()
+        extension, mimetype, quality_flag = ENCODINGS[self.image_format]
+        ok, encoded = cv2.imencode(extension, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), [quality_flag, self.quality])
+        if not ok:
+            raise ValueError(f"Could not encode frame as {self.image_format}")
+        timings = {'resize': resized - start, 'encode': time.perf_counter() - resized}
+        return encoded.tobytes(), mimetype, timings
+
+    def caption(self, image):
+        #returns the caption, or None when the server superseded it with a newer frame (409)
+        start = time.perf_counter()
+        payload, mimetype, timings = self.encode(image, CAPTION_SIZE)
+        response = self._post("/caption", timings, payload=payload, mimetype=mimetype, timeout=self.caption_timeout)
+        timings['total'] = time.perf_counter() - start
+        self.timings['caption'] = timings
+
+        if response.status_code == 409:
+            return None
+        result = self._json(response)
+        with self._lock:
+            self.frame_id = result.get("frame_id")
+            self.frame_id_time = time.time()
+        return result.get("caption", "No caption received.").strip()
+
+    def has_recent_frame(self):
+        with self._lock:
+            return self.frame_id is not None and time.time() - self.frame_id_time <= FRAME_REUSE_SECONDS
+
+    def follow_up(self, question, image=None):
+        #asks about the last captioned frame if it is recent, otherwise uploads image.
+        #returns None when there is neither a recent frame nor an image
+        start = time.perf_counter()
+        timings = {}
+        if self.has_recent_frame():
+            try:
+                response = self._post("/follow_up", timings, data={'question': question, 'frame_id': self.frame_id},
+                                      timeout=self.follow_up_timeout)
+            except requests.exceptions.RequestException:
+                #timed out or lost the connection; the upload below is the retry
+                if image is None:
+                    raise
+                response = None
+            if response is not None and response.status_code == 200:
+                timings['total'] = time.perf_counter() - start
+                timings['reused_frame'] = True
+                self.timings['follow_up'] = timings
+                return response.json().get("answer", "No answer returned.")
+            #the server forgot the frame (expired or restarted) or didn't answer; upload instead
+            with self._lock:
+                self.frame_id = None
+
+        if image is None:
+            return None
+        payload, mimetype, encode_timings = self.encode(image, FOLLOW_UP_SIZE)
+        timings.update(encode_timings)
+        response = self._post("/follow_up", timings, payload=payload, mimetype=mimetype,
+                              data={'question': question}, timeout=self.follow_up_timeout)
+        timings['total'] = time.perf_counter() - start
+        timings['reused_frame'] = False
+        self.timings['follow_up'] = timings
+        return self._json(response).get("answer", "No answer returned.")
+
+    def wait_until_ready(self, timeout=60.0, interval=1.0):
+        #polls /healthz until the server has its model warmed up; False if it never got there
+        deadline = time.time() + timeout
+        while True:
+            try:
+                if self.session.get(f"{self.server}/healthz", timeout=(CONNECT_TIMEOUT, 5)).status_code == 200:
+                    return True
+            except requests.exceptions.RequestException:
+                pass
+            if time.time() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def _post(self, path, timings, payload=None, mimetype=None, data=None, timeout=None):
+        files = None
+        if payload is not None:
+            extension = ENCODINGS[self.image_format][0]
+            files = {'image': (f"frame{extension}", payload, mimetype)}
+        start = time.perf_counter()
+        response = self.session.post(f"{self.server}{path}", files=files, data=data,
+                                     timeout=(CONNECT_TIMEOUT, timeout))
+        timings['request'] = timings.get('request', 0.0) + time.perf_counter() - start
+        return response
+
+    def _json(self, response):
+        if response.status_code != 200:
+            raise CaptionServerError(response.status_code, response.text)
+        return response.json()
@@ -1,18 +1,205 @@
 # This runs GPU server connection 
 # Make sure this is running before running programs needing server requests.
 # IMPORTANT: Change your server address 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from PIL import Image
 import io
+import os
+import re
+import json
 import base64
-from ollama import Client
+import hashlib
+import time
+import threading
+from caption_cache import CaptionCache, dhash #make sure caption_cache.py is in same folder
+from scheduler import PriorityScheduler, Superseded, QueueFull, INTERACTIVE, BACKGROUND
+from session_store import SessionStore
+from server_metrics import MetricsRegistry
+from ollama_pool import BackendPool
+from single_flight import SingleFlight
 
 # === Initialize Flask and Ollama ===
 app = Flask(__name__)
-client = Client()  #connects to local Ollama server at http://localhost:11434
 # can use "llava" or "llava-phi3" or "deepseek-v2:16b"
 ai_model = f"llava-phi3"
 
+# Ollama servers to spread requests over (least outstanding requests first).
+#   host: ollama address, model: overrides ai_model on that backend, max_in_flight: concurrent generations it takes
+# Set CAPTION_BACKENDS to a json file with the same list to override without editing this file
+OLLAMA_BACKENDS = [
+    {'host': 'http://localhost:11434'}, #local Ollama server
+]
+pool = BackendPool.from_config(os.environ.get("CAPTION_BACKENDS") or OLLAMA_BACKENDS)
+
+# === Model residency ===
+# how long ollama keeps the model loaded after the last request ("5m", "24h", -1 = forever).
+# ollama's default is 5 minutes, after which the next request pays the full model load again
+KEEP_ALIVE = -1
+
+WARMUP_RETRY_MIN = 2.0  #seconds before retrying a failed warm-up, doubled after each failure
+WARMUP_RETRY_MAX = 60.0
+
+# readiness for /healthz, filled in by warm_up()
+readiness = {
+    'ready': False,
+    'warmup_seconds': None,
+    'error': None,
+}
+
+# === Caption cache ===
+# near duplicate frames (same prompt + model) get the stored response instead of a new inference
+CACHE_CAPACITY = 256     #max cached responses
+CACHE_TTL = 30.0         #seconds before a cached response goes stale
+CACHE_MAX_DISTANCE = 4   #hamming distance (out of 64 bits) still treated as the same frame
+cache = CaptionCache(capacity=CACHE_CAPACITY, ttl=CACHE_TTL, max_distance=CACHE_MAX_DISTANCE)
+
+# === Frame sessions ===
+# /caption returns a frame_id; /follow_up can send it instead of the image and reuses the
+# stored image and ollama context from the caption
+SESSION_CAPACITY = 64   #max frames kept
+SESSION_TTL = 120.0     #seconds a frame_id stays valid
+sessions = SessionStore(capacity=SESSION_CAPACITY, ttl=SESSION_TTL)
+
+# === Scheduler ===
+# follow-ups jump ahead of queued captions, and a queued caption is dropped once the
+# same client sends a newer frame
+MAX_IN_FLIGHT = pool.capacity() #generations running at once, summed over the backends
+scheduler = PriorityScheduler(max_in_flight=MAX_IN_FLIGHT)
+
+def client_id():
+    #clients can name themselves, otherwise each address counts as one client
+    return request.values.get('client_id') or request.headers.get('X-Client-Id') or request.remote_addr
+
+def superseded_response(e):
+    return jsonify({'error': str(e), 'superseded': True}), 409
+
+# === In-flight de-duplication ===
+# a retry of a generation that is still running (same image bytes and prompt) waits for that
+# generation instead of starting another one. The model isn't part of the key, it is only known
+# once a backend is picked; the duplicate gets whatever that backend answered ('model' in the result)
+in_flight = SingleFlight()
+
+def content_key(data, prompt):
+    return (hashlib.blake2b(data, digest_size=16).hexdigest(), prompt)
+
+def backend_model(backend):
+    return backend.model or ai_model
+
+def cached_response(image_hash, prompt):
+    #(text, model) if a model the pool serves already answered this frame + prompt, else (None, None)
+    return cache.lookup(image_hash, prompt, pool.models(ai_model))
+
+# === Metrics ===
+# scraped from GET /metrics (prometheus text format)
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram(
+    "caption_server_stage_seconds",
+    "Time spent in each request stage (parse, hash, decode, resize, encode, queue_wait, model_load, prompt_eval, generation)",
+    labels=("endpoint", "model", "stage"),
+)
+REQUEST_SECONDS = metrics.histogram(
+    "caption_server_request_seconds",
+    "Time from request start until the response is returned (streams: until the stream starts)",
+    labels=("endpoint", "model"),
+)
+TOKENS_PER_SECOND = metrics.histogram(
+    "caption_server_tokens_per_second",
+    "Generation speed reported by ollama (eval_count / eval_duration)",
+    labels=("endpoint", "model"),
+    buckets=(1, 2, 5, 10, 20, 30, 40, 60, 80, 120, 160, 240),
+)
+GENERATED_TOKENS = metrics.counter("caption_server_generated_tokens_total", "Tokens generated", labels=("endpoint", "model"))
+IN_FLIGHT = metrics.gauge("caption_server_in_flight_requests", "Requests currently being handled", labels=("endpoint",))
+REQUESTS = metrics.counter("caption_server_requests_total", "Requests by response status", labels=("endpoint", "model", "status"))
+ERRORS = metrics.counter("caption_server_errors_total", "Errors by exception type", labels=("endpoint", "model", "type"))
+CACHE_EVENTS = metrics.gauge("caption_server_cache_events", "Caption cache hits and misses since start", labels=("result",))
+QUEUE_DEPTH = metrics.gauge("caption_server_queue_depth", "Generations waiting for a slot", labels=("priority",))
+
+#endpoints that get request level metrics
+INSTRUMENTED_ENDPOINTS = {'caption', 'follow_up', 'caption_stream', 'follow_up_stream'}
+NS = 1e9 #ollama reports durations in nanoseconds
+NO_MODEL = "none" #model label when nothing answered (bad request, failed before a backend was picked)
+
+
+class RequestMetrics:
+    #one request's measurements. They are reported once the request is over, labelled with the
+    #model that produced the response: the backend's model, or the one a cached answer came from
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.model = None
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.status = None
+        self._stages = []
+        self._responses = []
+        self._errors = []
+
+    def stage(self, stage, seconds):
+        self._stages.append((stage, seconds))
+
+    def stages(self, timings):
+        self._stages.extend(timings.items())
+
+    def generation(self, response):
+        #final ollama response (or the done chunk of a stream)
+        self._responses.append(response)
+
+    def error(self, e):
+        self._errors.append(type(e).__name__)
+
+    def respond(self, status):
+        #the response was returned (streams: the stream started)
+        self.seconds = time.perf_counter() - self.start
+        self.status = status
+
+    def report(self):
+        labels = {'endpoint': self.endpoint, 'model': self.model or NO_MODEL}
+        for stage, seconds in self._stages:
+            STAGE_SECONDS.observe(seconds, stage=stage, **labels)
+        for response in self._responses:
+            if response.get("load_duration"):
+                STAGE_SECONDS.observe(response["load_duration"] / NS, stage="model_load", **labels)
+            if response.get("prompt_eval_duration"):
+                STAGE_SECONDS.observe(response["prompt_eval_duration"] / NS, stage="prompt_eval", **labels)
+            eval_count = response.get("eval_count") or 0
+            eval_duration = response.get("eval_duration") or 0
+            if eval_duration:
+                STAGE_SECONDS.observe(eval_duration / NS, stage="generation", **labels)
+                TOKENS_PER_SECOND.observe(eval_count / (eval_duration / NS), **labels)
+            GENERATED_TOKENS.inc(eval_count, **labels)
+        for error_type in self._errors:
+            ERRORS.inc(type=error_type, **labels)
+        if self.seconds is not None:
+            REQUEST_SECONDS.observe(self.seconds, **labels)
+            REQUESTS.inc(status=self.status, **labels)
+
+
+def open_request_metrics(endpoint):
+    IN_FLIGHT.inc(endpoint=endpoint)
+    return RequestMetrics(endpoint)
+
+def close_request_metrics(request_metrics):
+    IN_FLIGHT.dec(endpoint=request_metrics.endpoint)
+    request_metrics.report()
+
+@app.before_request
+def start_request_metrics():
+    if request.endpoint in INSTRUMENTED_ENDPOINTS:
+        g.request_metrics = open_request_metrics(request.endpoint)
+
+@app.after_request
+def finish_request_metrics(response):
+    if 'request_metrics' in g:
+        g.request_metrics.respond(response.status_code)
+    return response
+
+@app.teardown_request
+def end_request_metrics(exc):
+    #runs after a stream has finished, so streams count as in flight until then and their
+    #metrics are reported with the model that generated them
+    if 'request_metrics' in g:
+        close_request_metrics(g.request_metrics)
+
 # === Prompts ===
 CAPTION_PROMPT = (
     "You are a visual assistant for someone who is visually impaired. "
@@ -31,80 +218,560 @@ FOLLOW_UP_PROMPT_TEMPLATE = (
     "Answer the following question about the image concisely and accurately: {}"
 )
 
-@app.route('/caption', methods=['POST'])
-def caption():
-    if 'image' not in request.files:
-        return jsonify({'error': 'No image file provided'}), 400
+CAPTION_OPTIONS = {
+    "temperature": 0.7,  # Lower temperature for more focused responses
+    "top_p": 0.9,       # Higher top_p for more diverse but relevant responses
+    "num_predict": 100   # Limit response length
+}
 
-    try:
-        #load and preprocess image
+CAPTION_PREAMBLES = ("I see", "I can see")
+
+def clean_caption(caption):
+    caption = caption.strip()
+    for preamble in CAPTION_PREAMBLES:
+        if caption == preamble or caption.startswith(preamble + " "):
+            return caption[len(preamble):].strip()
+    return caption
+
+def preamble_undecided(text):
+    #true while the start of a streamed caption could still turn into a preamble clean_caption drops
+    text = text.lstrip()
+    return any(preamble.startswith(text) for preamble in CAPTION_PREAMBLES)
+
+# === Image ingest ===
+# sizes the model actually sees for each endpoint
+CAPTION_SIZE = (512, 512)
+FOLLOW_UP_SIZE = (256, 256)
+
+# encoded formats ollama can take as-is, no need to decode + re-encode them
+PASSTHROUGH_FORMATS = {"JPEG", "PNG"}
+# raw rgb uploads (width*height*3 bytes, row major) from clients that skip encoding
+RAW_RGB_MIMETYPES = {"application/x-rgb", "application/octet-stream"}
+
+def read_upload():
+    #returns (bytes, mimetype) from the multipart 'image' field or a raw request body
+    if 'image' in request.files:
         image_file = request.files['image']
-        image = Image.open(image_file.stream).convert("RGB")
-        image = image.resize((512, 512))  #increased resolution for better detail
+        return image_file.read(), image_file.mimetype
+    if request.mimetype.startswith("image/") or request.mimetype in RAW_RGB_MIMETYPES:
+        data = request.get_data()
+        if data:
+            return data, request.mimetype
+    return None, None
+
+def prepare_image(data, mimetype, size, timings=None):
+    #returns (base64 image for ollama, True if the fast path was used)
+    #per stage seconds (decode/resize/encode) are added to timings if given
+    timings = timings if timings is not None else {}
+    width, height = size
+    start = time.perf_counter()
 
-        #conversts to base64 png
+    #raw rgb already at model size: wrap the pixels, encode once, skip the decode
+    if mimetype in RAW_RGB_MIMETYPES and len(data) == width * height * 3:
+        image = Image.frombuffer("RGB", size, data, "raw", "RGB", 0, 1)
         buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        image_bytes = buffer.getvalue()
-        image_b64 = base64.b64encode(image_bytes).decode('utf-8')
+        image.save(buffer, format="JPEG", quality=90)
+        image_b64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        timings['encode'] = time.perf_counter() - start
+        return image_b64, True
+
+    #Image.open only parses the header here, pixels are decoded lazily
+    image = Image.open(io.BytesIO(data))
+    if image.format in PASSTHROUGH_FORMATS and image.size == size and image.mode == "RGB":
+        timings['decode'] = time.perf_counter() - start
+        start = time.perf_counter()
+        image_b64 = base64.b64encode(data).decode('utf-8')
+        timings['encode'] = time.perf_counter() - start
+        return image_b64, True
+
+    #slow path: full decode, resize and png re-encode
+    image = image.convert("RGB")
+    timings['decode'] = time.perf_counter() - start
+    start = time.perf_counter()
+    image = image.resize(size)
+    timings['resize'] = time.perf_counter() - start
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    image_b64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    timings['encode'] = time.perf_counter() - start
+    return image_b64, False
+
+def frame_hash(data, mimetype, size):
+    #perceptual hash of the upload for the cache, opened separately so the draft decode
+    #doesn't touch the image we send to ollama
+    width, height = size
+    if mimetype in RAW_RGB_MIMETYPES and len(data) == width * height * 3:
+        image = Image.frombuffer("RGB", size, data, "raw", "RGB", 0, 1)
+    else:
+        image = Image.open(io.BytesIO(data))
+    return dhash(image)
+
+
+def timed_hash(data, mimetype, size, request_metrics):
+    start = time.perf_counter()
+    image_hash = frame_hash(data, mimetype, size)
+    request_metrics.stage("hash", time.perf_counter() - start)
+    return image_hash
+
+def timed_prepare(data, mimetype, size, request_metrics):
+    timings = {}
+    result = prepare_image(data, mimetype, size, timings)
+    request_metrics.stages(timings)
+    return result
+
+
+# === Request handling ===
+# The endpoints only parse the request; the work is done by caption_upload, answer_follow_up,
+# caption_events and follow_up_events, which caption_server_async.py calls as well, so both
+# servers go through the same cache, sessions, scheduler, backend pool and metrics.
+def caption_upload(data, mimetype, requester, request_metrics):
+    #returns the /caption response body
+    image_hash = timed_hash(data, mimetype, CAPTION_SIZE, request_metrics)
+    cached, model = cached_response(image_hash, CAPTION_PROMPT)
+    if cached is not None:
+        request_metrics.model = model
+        frame_id = sessions.create(image_hash, data=data, mimetype=mimetype)
+        return {'caption': cached, 'cached': True, 'frame_id': frame_id, 'model': model}
+
+    def generate_caption():
+        #load and preprocess image (512x512 for better detail)
+        image_b64, fast_path = timed_prepare(data, mimetype, CAPTION_SIZE, request_metrics)
 
         #generate caption
-        response = client.generate(
-            model=ai_model,
-            prompt=CAPTION_PROMPT,
-            images=[image_b64],
-            options={
-                "temperature": 0.7,  # Lower temperature for more focused responses
-                "top_p": 0.9,       # Higher top_p for more diverse but relevant responses
-                "num_predict": 100   # Limit response length
-            }
-        )
+        with scheduler.slot(BACKGROUND, requester) as ticket, pool.lease() as backend:
+            model = request_metrics.model = backend_model(backend)
+            response = backend.client.generate(
+                model=model,
+                prompt=CAPTION_PROMPT,
+                images=[image_b64],
+                options=CAPTION_OPTIONS,
+                keep_alive=KEEP_ALIVE,
+            )
+        request_metrics.stage("queue_wait", ticket.queue_wait)
+        request_metrics.generation(response)
 
-        caption = response.get("response", "No caption returned.")
         # Clean up the response
-        caption = caption.strip()
-        if caption.startswith("I see") or caption.startswith("I can see"):
-            caption = caption[2:].strip()
-        return jsonify({'caption': caption})
+        caption = clean_caption(response.get("response", "No caption returned."))
+        cache.put(image_hash, CAPTION_PROMPT, model, caption)
+        frame_id = sessions.create(
+            image_hash, image_b64=image_b64, context=response.get("context"), backend=backend.name
+        )
+        return {
+            'caption': caption, 'fast_path': fast_path, 'cached': False,
+            'queue_wait': round(ticket.queue_wait, 3), 'frame_id': frame_id, 'model': model,
+        }
+
+    result, coalesced = in_flight.do(content_key(data, CAPTION_PROMPT), generate_caption)
+    request_metrics.model = result['model']
+    return dict(result, coalesced=coalesced)
 
+@app.route('/caption', methods=['POST'])
+def caption():
+    request_metrics = g.request_metrics
+    start = time.perf_counter()
+    data, mimetype = read_upload()
+    request_metrics.stage("parse", time.perf_counter() - start)
+    if data is None:
+        return jsonify({'error': 'No image file provided'}), 400
+
+    try:
+        return jsonify(caption_upload(data, mimetype, client_id(), request_metrics))
+    except Superseded as e:
+        return superseded_response(e)
     except Exception as e:
+        request_metrics.error(e)
         return jsonify({'error': str(e)}), 500
 
 
 
+def read_follow_up():
+    #returns (error response, question, session, data, mimetype); the image is either a new
+    #upload or the frame_id of an earlier /caption
+    question = request.values.get('question')
+    frame_id = request.values.get('frame_id')
+    data, mimetype = read_upload()
+    session = sessions.get(frame_id) if frame_id and data is None else None
+
+    if not question:
+        return (jsonify({'error': 'Missing image or question'}), 400), None, None, None, None
+    if data is None and session is None:
+        if frame_id:
+            #client should fall back to uploading the image
+            return (jsonify({'error': 'Unknown or expired frame_id'}), 404), None, None, None, None
+        return (jsonify({'error': 'Missing image or question'}), 400), None, None, None, None
+    return None, question, session, data, mimetype
+
+def session_inputs(session, backend_name=None):
+    #generate() arguments for a follow-up on a stored frame. With the caption's context the
+    #image tokens are already in there, so the image isn't sent (or prefilled) again.
+    #The context only makes sense on the backend (model) that produced it
+    with session.lock:
+        if session.context and (backend_name is None or backend_name == session.backend):
+            return {'context': session.context}
+        if session.image_b64 is None:
+            session.image_b64, _ = prepare_image(session.data, session.mimetype, CAPTION_SIZE)
+            session.data = None
+        return {'images': [session.image_b64]}
+
+def follow_up_inputs(session, data, mimetype, timings=None):
+    #returns (generate() arguments, fast path used)
+    if session is not None:
+        return session_inputs(session), True
+    image_b64, fast_path = prepare_image(data, mimetype, FOLLOW_UP_SIZE, timings)
+    return {'images': [image_b64]}, fast_path
+
+def timed_follow_up_inputs(session, data, mimetype, request_metrics):
+    timings = {}
+    result = follow_up_inputs(session, data, mimetype, timings)
+    request_metrics.stages(timings)
+    return result
+
+def answer_follow_up(question, session, data, mimetype, requester, request_metrics):
+    #returns the /follow_up response body; session is the frame_id's session, or None with an upload
+    prompt = FOLLOW_UP_PROMPT_TEMPLATE.format(question)
+
+    image_hash = session.image_hash if session else timed_hash(data, mimetype, FOLLOW_UP_SIZE, request_metrics)
+    cached, model = cached_response(image_hash, prompt)
+    if cached is not None:
+        request_metrics.model = model
+        return {'answer': cached, 'cached': True, 'model': model}
+
+    def generate_answer():
+        inputs, fast_path = timed_follow_up_inputs(session, data, mimetype, request_metrics)
+
+        prefer = session.backend if session else None
+        with scheduler.slot(INTERACTIVE, requester) as ticket, pool.lease(prefer) as backend:
+            model = request_metrics.model = backend_model(backend)
+            if session is not None:
+                inputs = session_inputs(session, backend.name)
+            response = backend.client.generate(
+                model=model,  # use "llava" or "llava-phi3"
+                prompt=prompt,
+                keep_alive=KEEP_ALIVE,
+                **inputs,
+            )
+        request_metrics.stage("queue_wait", ticket.queue_wait)
+        request_metrics.generation(response)
+
+        answer = response.get("response", "No answer returned.")
+        cache.put(image_hash, prompt, model, answer)
+        return {
+            'answer': answer, 'fast_path': fast_path, 'cached': False,
+            'queue_wait': round(ticket.queue_wait, 3), 'model': model,
+        }
+
+    #follow-ups on a stored frame are keyed by the frame, uploads by their bytes
+    key = ('frame', session.image_hash, prompt) if session else content_key(data, prompt)
+    result, coalesced = in_flight.do(key, generate_answer)
+    request_metrics.model = result['model']
+    return dict(result, coalesced=coalesced)
+
 @app.route('/follow_up', methods=['POST'])
 def follow_up():
-    if 'image' not in request.files or 'question' not in request.form:
-        return jsonify({'error': 'Missing image or question'}), 400
+    request_metrics = g.request_metrics
+    start = time.perf_counter()
+    error, question, session, data, mimetype = read_follow_up()
+    request_metrics.stage("parse", time.perf_counter() - start)
+    if error:
+        return error
 
     try:
-        image_file = request.files['image']
-        question = request.form['question']
+        return jsonify(answer_follow_up(question, session, data, mimetype, client_id(), request_metrics))
+    except Exception as e:
+        request_metrics.error(e)
+        return jsonify({'error': str(e)}), 500
 
-        image = Image.open(image_file.stream).convert("RGB")
-        image = image.resize((256, 256))
 
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        image_bytes = buffer.getvalue()
-        image_b64 = base64.b64encode(image_bytes).decode('utf-8')
+# === Streaming endpoints (server-sent events) ===
+# Same as /caption and /follow_up but tokens are forwarded as ollama produces them.
+# Events:
+#   start    {"queue_wait": seconds}        generation got a slot on the model (+ frame_id on captions)
+#   token    {"text": ...}                  every chunk from ollama
+#   sentence {"text": ..., "index": n}      each completed sentence, ready for tts
+#   done     {"text": ..., "cached": bool}  full response (+ the model that generated it)
+#   error    {"error": ...}
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
 
-        prompt = FOLLOW_UP_PROMPT_TEMPLATE.format(question)
+def sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-        response = client.generate(
-            model=ai_model,  # use "llava" or "llava-phi3"
-            prompt=prompt,
-            images=[image_b64],
-        )
+def split_sentences(buffer):
+    #returns (complete sentences, leftover text still being generated)
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(buffer):
+        sentence = buffer[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    return sentences, buffer[start:]
 
-        answer = response.get("response", "No answer returned.")
-        return jsonify({'answer': answer})
+def clean_start(text, clean):
+    #clean() strips the text, but the whitespace after it belongs between this token and the next
+    return clean(text) + text[len(text.rstrip()):]
+
+def stream_response(image_hash, prompt, inputs, priority, requester, request_metrics, options=None, clean=None,
+                    frame_id=None, source=None):
+    #inputs are the images/context arguments for generate(). If frame_id is given the
+    #caption's context is stored on that session once generation is done. source is the
+    #session a follow-up is about
+    full_text = ""
+    pending = ""
+    index = 0
+    holding = clean is not None #first tokens are held back until clean() can be applied to them
+    session = sessions.get(frame_id) if frame_id else None
+    prefer = source.backend if source else None
+    try:
+        with scheduler.slot(priority, requester) as ticket, pool.lease(prefer) as backend:
+            model = request_metrics.model = backend_model(backend)
+            request_metrics.stage("queue_wait", ticket.queue_wait)
+            if session is not None:
+                with session.lock:
+                    session.backend = backend.name
+            if source is not None:
+                inputs = session_inputs(source, backend.name)
+            start = {'queue_wait': round(ticket.queue_wait, 3)}
+            if frame_id:
+                start['frame_id'] = frame_id
+            yield sse("start", start)
+            for chunk in backend.client.generate(
+                model=model,
+                prompt=prompt,
+                options=options,
+                keep_alive=KEEP_ALIVE,
+                stream=True,
+                **inputs,
+            ):
+                if chunk.get("done"):
+                    request_metrics.generation(chunk)
+                    if session is not None:
+                        with session.lock:
+                            session.context = chunk.get("context")
+                token = chunk.get("response", "")
+                if not token:
+                    continue
+                full_text += token
+                if holding:
+                    if preamble_undecided(full_text):
+                        continue
+                    holding = False
+                    token = clean_start(full_text, clean)
+                pending += token
+                yield sse("token", {'text': token})
+
+                sentences, pending = split_sentences(pending)
+                for sentence in sentences:
+                    yield sse("sentence", {'text': sentence, 'index': index})
+                    index += 1
+
+        if holding and full_text.strip():
+            pending = clean(full_text) #the whole caption was shorter than a preamble
+            yield sse("token", {'text': pending})
+        if pending.strip():
+            yield sse("sentence", {'text': pending.strip(), 'index': index})
+
+        text = clean(full_text) if clean else full_text.strip()
+        cache.put(image_hash, prompt, model, text)
+        yield sse("done", {'text': text, 'cached': False, 'queue_wait': round(ticket.queue_wait, 3), 'model': model})
+    except Superseded as e:
+        yield sse("error", {'error': str(e), 'superseded': True})
+    except QueueFull as e:
+        yield sse("error", {'error': str(e), 'retry_after': e.retry_after})
+    except Exception as e:
+        request_metrics.error(e)
+        yield sse("error", {'error': str(e)})
+
+def stream_cached(text, frame_id=None, model=None):
+    if frame_id:
+        yield sse("start", {'queue_wait': 0.0, 'frame_id': frame_id})
+    sentences, rest = split_sentences(text + " ")
+    for index, sentence in enumerate(sentences):
+        yield sse("sentence", {'text': sentence, 'index': index})
+    yield sse("done", {'text': text, 'cached': True, 'model': model})
+
+def event_stream(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+def caption_events(data, mimetype, requester, request_metrics):
+    #returns the /caption/stream events. Errors before the stream starts (bad image, full queue)
+    #are raised here so they get a plain error response
+    image_hash = timed_hash(data, mimetype, CAPTION_SIZE, request_metrics)
+    cached, model = cached_response(image_hash, CAPTION_PROMPT)
+    if cached is not None:
+        request_metrics.model = model
+        frame_id = sessions.create(image_hash, data=data, mimetype=mimetype)
+        return stream_cached(cached, frame_id, model)
+
+    scheduler.check(BACKGROUND, requester)
+    image_b64, _ = timed_prepare(data, mimetype, CAPTION_SIZE, request_metrics)
+    frame_id = sessions.create(image_hash, image_b64=image_b64)
+    return stream_response(
+        image_hash, CAPTION_PROMPT, {'images': [image_b64]}, BACKGROUND, requester, request_metrics,
+        options=CAPTION_OPTIONS, clean=clean_caption, frame_id=frame_id
+    )
+
+def follow_up_events(question, session, data, mimetype, requester, request_metrics):
+    #returns the /follow_up/stream events, errors before the stream starts are raised
+    prompt = FOLLOW_UP_PROMPT_TEMPLATE.format(question)
+    image_hash = session.image_hash if session else timed_hash(data, mimetype, FOLLOW_UP_SIZE, request_metrics)
+    cached, model = cached_response(image_hash, prompt)
+    if cached is not None:
+        request_metrics.model = model
+        return stream_cached(cached, model=model)
 
+    scheduler.check(INTERACTIVE, requester)
+    inputs, _ = timed_follow_up_inputs(session, data, mimetype, request_metrics)
+    return stream_response(image_hash, prompt, inputs, INTERACTIVE, requester, request_metrics, source=session)
+
+@app.route('/caption/stream', methods=['POST'])
+def caption_stream():
+    request_metrics = g.request_metrics
+    start = time.perf_counter()
+    data, mimetype = read_upload()
+    request_metrics.stage("parse", time.perf_counter() - start)
+    if data is None:
+        return jsonify({'error': 'No image file provided'}), 400
+
+    try:
+        events = caption_events(data, mimetype, client_id(), request_metrics)
     except Exception as e:
+        request_metrics.error(e)
         return jsonify({'error': str(e)}), 500
+    return event_stream(events)
+
+@app.route('/follow_up/stream', methods=['POST'])
+def follow_up_stream():
+    request_metrics = g.request_metrics
+    start = time.perf_counter()
+    error, question, session, data, mimetype = read_follow_up()
+    request_metrics.stage("parse", time.perf_counter() - start)
+    if error:
+        return error
+
+    try:
+        events = follow_up_events(question, session, data, mimetype, client_id(), request_metrics)
+    except Exception as e:
+        request_metrics.error(e)
+        return jsonify({'error': str(e)}), 500
+    return event_stream(events)
+
+
+# === Warm-up and readiness ===
+def warm_up_image():
+    #synthetic grey frame at caption size, enough to load the model and the vision projector
+    buffer = io.BytesIO()
+    Image.new("RGB", CAPTION_SIZE, (128, 128, 128)).save(buffer, format="JPEG")
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+def warm_up_backend(backend, image_b64, start):
+    #returns True once the backend has answered
+    model = backend_model(backend)
+    print(f"Warming up {model} on {backend.name}...")
+    backend_start = time.time()
+    try:
+        backend.client.generate(
+            model=model,
+            prompt="Describe this image in one word.",
+            images=[image_b64],
+            options={"num_predict": 1},
+            keep_alive=KEEP_ALIVE,
+        )
+    except Exception as e:
+        readiness['error'] = f"{backend.name}: {e}"
+        print(f"Warm-up failed on {backend.name}: {e}")
+        return False
+    backend.warmup_seconds = round(time.time() - backend_start, 3)
+    print(f"{model} on {backend.name} ready after {backend.warmup_seconds:.2f} seconds")
+    if not readiness['ready']:
+        readiness['warmup_seconds'] = round(time.time() - start, 3)
+        readiness['ready'] = True
+        readiness['error'] = None
+    return True
+
+def warm_up():
+    #every backend gets warmed up, the server is ready as soon as one of them is. backends that
+    #are down at boot are retried with backoff, so the server becomes ready once one comes up
+    start = time.time()
+    image_b64 = warm_up_image()
+    pending = list(pool.backends)
+    delay = WARMUP_RETRY_MIN
+    while True:
+        pending = [backend for backend in pending if not warm_up_backend(backend, image_b64, start)]
+        if not pending:
+            return
+        print(f"Retrying warm-up of {len(pending)} backend(s) in {delay:.0f} seconds")
+        time.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX)
+
+def model_loaded():
+    #asks each ollama backend which models are resident right now
+    loaded = None
+    for backend in pool.backends:
+        model = backend_model(backend).split(':')[0]
+        try:
+            running = backend.probe_client.ps().get('models', [])
+        except Exception:
+            continue #down, or an older ollama without /api/ps
+        loaded = loaded or any(m.get('model', m.get('name', '')).split(':')[0] == model for m in running)
+    return loaded
+
+def health_status():
+    #returns (body, status code) for /healthz
+    status = dict(readiness, model=ai_model, models=pool.models(ai_model), model_loaded=model_loaded(), keep_alive=KEEP_ALIVE)
+    return status, 200 if readiness['ready'] else 503
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    status, code = health_status()
+    return jsonify(status), code
+
+
+METRICS_MIMETYPE = 'text/plain; version=0.0.4'
+
+def render_metrics():
+    #point in time values are read when scraped
+    cache_stats = cache.stats()
+    CACHE_EVENTS.set(cache_stats['hits'], result="hit")
+    CACHE_EVENTS.set(cache_stats['misses'], result="miss")
+    queue_stats = scheduler.stats()
+    QUEUE_DEPTH.set(queue_stats['waiting_interactive'], priority="interactive")
+    QUEUE_DEPTH.set(queue_stats['waiting_background'], priority="background")
+    return metrics.render()
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype=METRICS_MIMETYPE)
+
+
+@app.route('/backends', methods=['GET'])
+def backend_stats():
+    return jsonify(pool.stats())
+
+def queue_status():
+    return dict(scheduler.stats(), single_flight=in_flight.stats())
+
+@app.route('/queue', methods=['GET'])
+def queue_stats():
+    return jsonify(queue_status())
+
+@app.route('/cache', methods=['GET'])
+def cache_stats():
+    return jsonify(cache.stats())
+
+@app.route('/sessions', methods=['GET'])
+def session_stats():
+    return jsonify(sessions.stats())
 
 
 # === Run server ===
 if __name__ == '__main__':
+    #warm up in the background so /healthz can answer while the model loads
+    threading.Thread(target=warm_up, daemon=True).start()
+    pool.start_health_checks()
     app.run(host='0.0.0.0', port=8000, threaded = True)
 
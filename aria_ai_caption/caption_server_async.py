@@ -0,0 +1,252 @@
+# Async (ASGI) version of caption_server.py for when several clients share the GPU(s).
+# Same endpoints and the same request handling: uploads are read on the event loop and the rest
+# runs through caption_server's functions on worker threads, so both servers share one cache,
+# session store, priority scheduler, backend pool, retry coalescing and metrics. The difference
+# is the queue: at most MAX_QUEUE generations wait for a slot, past that requests get a fast 503
+# with a Retry-After hint instead of piling onto the model.
+# Run with: python caption_server_async.py  (or: hypercorn caption_server_async:app -b 0.0.0.0:8000)
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from quart import Quart, request, jsonify, Response, make_response
+
+import caption_server as common #request handling, cache, sessions, scheduler and pool are shared with the flask server
+from caption_server import (
+    RAW_RGB_MIMETYPES, METRICS_MIMETYPE, scheduler, sessions, cache, pool, warm_up,
+    caption_upload, answer_follow_up, caption_events, follow_up_events,
+    open_request_metrics, close_request_metrics, health_status, render_metrics, queue_status,
+)
+from scheduler import Superseded, QueueFull
+
+# === Concurrency limits ===
+# generations running at once: caption_server.MAX_IN_FLIGHT, the capacity of the backend pool
+MAX_QUEUE = 4    #generations allowed to wait for a slot before we start returning 503
+CPU_WORKERS = 4  #threads for hashing, image prep and cache hits
+scheduler.max_queue = MAX_QUEUE
+
+# each admitted generation can hold a thread while it waits for a slot or for ollama. Streams
+# get their own threads: a stream holds its slot between events, and must always be able to
+# fetch the next one, or requests queued behind it could take every thread and never get the slot
+workers = ThreadPoolExecutor(max_workers=common.MAX_IN_FLIGHT + MAX_QUEUE + CPU_WORKERS,
+                             thread_name_prefix="caption-worker")
+stream_workers = ThreadPoolExecutor(max_workers=common.MAX_IN_FLIGHT + MAX_QUEUE,
+                                    thread_name_prefix="caption-stream")
+
+# === Initialize Quart ===
+app = Quart(__name__)
+
+@app.before_serving
+async def start_background_work():
+    #warm up in the background so /healthz can answer while the model loads
+    threading.Thread(target=warm_up, daemon=True).start()
+    pool.start_health_checks()
+
+async def run_blocking(func, *args):
+    #caption_server's request handling blocks (hashing, image prep, waiting for a slot, generating)
+    return await asyncio.get_running_loop().run_in_executor(workers, func, *args)
+
+def instrumented(handler):
+    #what caption_server's before/after/teardown request hooks do. A stream reports its
+    #metrics once it is over (close_stream), anything else when the response is returned
+    @functools.wraps(handler)
+    async def wrapper(**kwargs):
+        request_metrics = open_request_metrics(request.endpoint)
+        response = None
+        try:
+            response = await make_response(await handler(request_metrics, **kwargs))
+            request_metrics.respond(response.status_code)
+            return response
+        finally:
+            if response is None or response.mimetype != 'text/event-stream':
+                close_request_metrics(request_metrics)
+    return wrapper
+
+def queue_full_response(error):
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after, 'queue': queue_status()})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def superseded_response(error):
+    return jsonify({'error': str(error), 'superseded': True}), 409
+
+
+async def read_upload():
+    #async version of caption_server.read_upload
+    files = await request.files
+    if 'image' in files:
+        image_file = files['image']
+        return image_file.read(), image_file.mimetype
+    if request.mimetype.startswith("image/") or request.mimetype in RAW_RGB_MIMETYPES:
+        data = await request.get_data()
+        if data:
+            return data, request.mimetype
+    return None, None
+
+async def read_value(name):
+    form = await request.form
+    return form.get(name) or request.args.get(name)
+
+async def client_id():
+    #async version of caption_server.client_id
+    return await read_value('client_id') or request.headers.get('X-Client-Id') or request.remote_addr
+
+async def read_follow_up():
+    #async version of caption_server.read_follow_up
+    question = await read_value('question')
+    frame_id = await read_value('frame_id')
+    data, mimetype = await read_upload()
+    session = sessions.get(frame_id) if frame_id and data is None else None
+
+    if not question:
+        return (jsonify({'error': 'Missing image or question'}), 400), None, None, None, None
+    if data is None and session is None:
+        if frame_id:
+            return (jsonify({'error': 'Unknown or expired frame_id'}), 404), None, None, None, None
+        return (jsonify({'error': 'Missing image or question'}), 400), None, None, None, None
+    return None, question, session, data, mimetype
+
+
+@app.route('/caption', methods=['POST'])
+@instrumented
+async def caption(request_metrics):
+    start = time.perf_counter()
+    data, mimetype = await read_upload()
+    request_metrics.stage("parse", time.perf_counter() - start)
+    if data is None:
+        return jsonify({'error': 'No image file provided'}), 400
+
+    try:
+        return jsonify(await run_blocking(caption_upload, data, mimetype, await client_id(), request_metrics))
+    except QueueFull as e:
+        return queue_full_response(e)
+    except Superseded as e:
+        return superseded_response(e)
+    except Exception as e:
+        request_metrics.error(e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/follow_up', methods=['POST'])
+@instrumented
+async def follow_up(request_metrics):
+    start = time.perf_counter()
+    error, question, session, data, mimetype = await read_follow_up()
+    request_metrics.stage("parse", time.perf_counter() - start)
+    if error:
+        return error
+
+    try:
+        return jsonify(await run_blocking(
+            answer_follow_up, question, session, data, mimetype, await client_id(), request_metrics
+        ))
+    except QueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        request_metrics.error(e)
+        return jsonify({'error': str(e)}), 500
+
+
+# === Streaming endpoints (server-sent events, same events as caption_server.py) ===
+# caption_server's event generators block, so every event is fetched on a stream worker. The
+# slot is taken inside the generator (on its first event), and closing it releases the slot
+# and the backend lease, so a client that disconnects frees them as soon as the current
+# next() returns
+async def relay(events, request_metrics):
+    pending = None
+    try:
+        while True:
+            pending = stream_workers.submit(next, events, None)
+            event = await asyncio.wrap_future(pending)
+            if event is None:
+                return
+            yield event
+    finally:
+        stream_workers.submit(close_stream, events, pending, request_metrics)
+
+def close_stream(events, pending, request_metrics):
+    #a generator can't be closed while another thread is inside it
+    if pending is not None:
+        wait([pending])
+    events.close()
+    close_request_metrics(request_metrics)
+
+def event_stream(events, request_metrics):
+    return Response(
+        relay(events, request_metrics),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/caption/stream', methods=['POST'])
+@instrumented
+async def caption_stream(request_metrics):
+    start = time.perf_counter()
+    data, mimetype = await read_upload()
+    request_metrics.stage("parse", time.perf_counter() - start)
+    if data is None:
+        return jsonify({'error': 'No image file provided'}), 400
+
+    try:
+        #a full queue gets a plain 503 here rather than an error event later
+        events = await run_blocking(caption_events, data, mimetype, await client_id(), request_metrics)
+    except QueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        request_metrics.error(e)
+        return jsonify({'error': str(e)}), 500
+    return event_stream(events, request_metrics)
+
+@app.route('/follow_up/stream', methods=['POST'])
+@instrumented
+async def follow_up_stream(request_metrics):
+    start = time.perf_counter()
+    error, question, session, data, mimetype = await read_follow_up()
+    request_metrics.stage("parse", time.perf_counter() - start)
+    if error:
+        return error
+
+    try:
+        events = await run_blocking(
+            follow_up_events, question, session, data, mimetype, await client_id(), request_metrics
+        )
+    except QueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        request_metrics.error(e)
+        return jsonify({'error': str(e)}), 500
+    return event_stream(events, request_metrics)
+
+
+@app.route('/healthz', methods=['GET'])
+async def healthz():
+    #asks the backends which models are loaded, so off the event loop
+    status, code = await run_blocking(health_status)
+    return jsonify(status), code
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    return Response(render_metrics(), mimetype=METRICS_MIMETYPE)
+
+@app.route('/backends', methods=['GET'])
+async def backend_stats():
+    return jsonify(pool.stats())
+
+@app.route('/queue', methods=['GET'])
+async def queue_stats():
+    return jsonify(queue_status())
+
+@app.route('/cache', methods=['GET'])
+async def cache_stats():
+    return jsonify(cache.stats())
+
+@app.route('/sessions', methods=['GET'])
+async def session_stats():
+    return jsonify(sessions.stats())
+
+
+# === Run server ===
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=8000)
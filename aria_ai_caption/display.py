@@ -0,0 +1,103 @@
+# OpenCV preview window for the Aria client scripts
+# Redraws only when there is a new frame (or the caption changed), draws the frame's window sized
+# pyramid level (downscaled and rotated in one pass, see preprocess.py) and keeps the rendered
+# caption/FPS overlay cached until its text changes. A full 1408x1408 cvtColor + putText every
+# 10 ms was a whole core.
+#
+# Usage:
+#   display = FrameDisplay(observer.frames, "Aria RGB + LLaVA Caption")
+#   while display.poll_key() != ord("q"):
+#       display.render(observer.caption)
+#   display.close()
+import time
+
+import cv2
+import numpy as np
+
+from preprocess import DISPLAY_SIZE
+
+WINDOW_SIZE = DISPLAY_SIZE #aria rgb frames are square
+OVERLAY_HEIGHT = 32      #caption strip at the top of the window
+CAPTION_CHARS = 80       #longer captions are cut off with "..."
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.5
+
+
+class FrameDisplay:
+    def __init__(self, frames, window_name, size=WINDOW_SIZE, show_fps=True):
+        self.frames = frames
+        self.window_name = window_name
+        self.size = size
+        self.show_fps = show_fps
+        self.fps = 0.0 #frames actually drawn per second
+
+        width, height = size
+        self._bgr = np.zeros((height, width, 3), dtype=np.uint8)    #last frame, converted
+        self._canvas = np.zeros((height, width, 3), dtype=np.uint8) #frame + overlay, what is shown
+        self._shown_seq = 0
+        self._overlay_key = None
+        self._overlay = None
+        self._overlay_mask = None
+        self._fps_count = 0
+        self._fps_start = time.time()
+
+        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+        cv2.resizeWindow(window_name, width, height)
+
+    def render(self, caption=""):
+        #returns True if the window was redrawn
+        seq = self.frames.latest_seq()
+        new_frame = seq != self._shown_seq
+        if new_frame:
+            with self.frames.view() as frame:
+                if frame is None:
+                    return False
+                #cached upright level: the colour conversion runs on window-sized pixels
+                small = frame.level(self.size)
+                self._shown_seq = frame.seq
+            cv2.cvtColor(small, cv2.COLOR_RGB2BGR, dst=self._bgr)
+            self._count_frame()
+        elif not self._shown_seq:
+            return False
+
+        key = (caption, round(self.fps) if self.show_fps else None)
+        if not new_frame and key == self._overlay_key:
+            return False
+        if key != self._overlay_key:
+            self._render_overlay(*key)
+
+        np.copyto(self._canvas, self._bgr)
+        strip = self._canvas[:OVERLAY_HEIGHT]
+        np.copyto(strip, self._overlay, where=self._overlay_mask)
+        cv2.imshow(self.window_name, self._canvas)
+        return True
+
+    def poll_key(self, wait_ms=10):
+        #also paces the loop and keeps the window responsive; returns the key code or -1
+        key = cv2.waitKey(wait_ms)
+        return key & 0xFF if key != -1 else -1
+
+    def close(self):
+        cv2.destroyWindow(self.window_name)
+
+    def _count_frame(self):
+        self._fps_count += 1
+        elapsed = time.time() - self._fps_start
+        if elapsed >= 1.0:
+            self.fps = self._fps_count / elapsed
+            self._fps_count = 0
+            self._fps_start = time.time()
+
+    def _render_overlay(self, caption, fps):
+        #white text on a transparent strip; only re-rendered when the text changes
+        width = self.size[0]
+        overlay = np.zeros((OVERLAY_HEIGHT, width, 3), dtype=np.uint8)
+        text = caption[:CAPTION_CHARS] + "..." if len(caption) > CAPTION_CHARS else caption
+        cv2.putText(overlay, text, (10, 22), FONT, FONT_SCALE, (255, 255, 255), 1, cv2.LINE_AA)
+        if fps is not None:
+            label = f"{fps} fps"
+            (label_width, _), _ = cv2.getTextSize(label, FONT, FONT_SCALE, 1)
+            cv2.putText(overlay, label, (width - label_width - 10, 22), FONT, FONT_SCALE, (0, 255, 0), 1, cv2.LINE_AA)
+        self._overlay = overlay
+        self._overlay_mask = overlay.any(axis=2, keepdims=True)
+        self._overlay_key = (caption, fps)
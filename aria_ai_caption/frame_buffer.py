@@ -0,0 +1,163 @@
+# Ring buffer of the most recent RGB frames from the Aria SDK callback
+# The SDK reuses its image buffer, so each frame is copied once (a plain memcpy, still in sensor
+# orientation) into a preallocated contiguous slot together with its capture timestamp. Readers
+# pin the slots they look at, and the writer never writes into a pinned slot or the newest one,
+# so a frame can be read without copying and without it changing underneath the reader.
+# Consumers ask for frame.level(size): upright RGB at that size, built once per frame by
+# preprocess.py and shared by everyone else asking for the same size.
+#
+# Usage:
+#   frames = FrameRingBuffer()
+#   frames.write(image, record.capture_timestamp_ns)     #SDK callback thread
+#   with frames.view() as frame:                          #any other thread, zero-copy
+#       if frame is not None:
+#           cv2.imshow("rgb", cv2.cvtColor(frame.level((640, 640)), cv2.COLOR_RGB2BGR))
+#   frame = frames.copy(size=(256, 256))                  #owned 256px upright frame, e.g. for a worker thread
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from preprocess import FramePyramid
+
+DEFAULT_CAPACITY = 4 #frames kept; at least 2 so the writer always has a free slot
+
+
+class Frame:
+    def __init__(self, image, timestamp_ns, seq, pyramid=None, rotate=False):
+        self.image = image #HxWx3 RGB as stored; read-only when it is a view into the buffer
+        self.timestamp_ns = timestamp_ns #record.capture_timestamp_ns (device clock)
+        self.seq = seq #increases by one per written frame
+        self.pyramid = pyramid if pyramid is not None else FramePyramid(image, rotate=rotate)
+
+    def level(self, size):
+        #upright RGB at size (width, height), read-only; computed once per frame and size
+        return self.pyramid.get(size)
+
+
+class FrameRingBuffer:
+    def __init__(self, capacity=DEFAULT_CAPACITY, rotate=True):
+        if capacity < 2:
+            raise ValueError("FrameRingBuffer needs capacity >= 2")
+        self.capacity = capacity
+        self.rotate = rotate #aria rgb frames arrive rotated 90 degrees; undone per level, after downscaling
+        self.written = 0
+        self.dropped = 0 #frames skipped because every free slot was pinned by readers
+
+        self._slots = None #(capacity, H, W, 3), allocated on the first frame
+        self._seq = [0] * capacity #0 = empty or being written
+        self._timestamps = [0] * capacity
+        self._pyramids = [None] * capacity #per slot cache of downscaled upright levels
+        self._pins = [0] * capacity
+        self._latest = None #slot index of the newest complete frame
+        self._next_seq = 1
+        self._cond = threading.Condition()
+
+    def write(self, image, timestamp_ns):
+        with self._cond:
+            if self._slots is None or self._slots.shape[1:] != image.shape or self._slots.dtype != image.dtype:
+                #first frame or the stream resolution changed; views into the old array stay valid
+                self._slots = np.empty((self.capacity,) + image.shape, dtype=image.dtype)
+                self._seq = [0] * self.capacity
+                self._latest = None
+            index = self._free_slot()
+            if index is None:
+                self.dropped += 1
+                return False
+            self._seq[index] = 0 #readers skip it while it is being filled
+            slot = self._slots[index]
+
+        #the one full size copy per frame, done outside the lock so readers are never blocked on it.
+        #no rotation here: rotating 1408x1408 is a strided copy, rotating a 256px level is nothing
+        np.copyto(slot, image)
+        stored = slot.view()
+        stored.flags.writeable = False
+        pyramid = FramePyramid(stored, rotate=self.rotate)
+
+        with self._cond:
+            if self._slots is not None and slot.base is self._slots:
+                self._seq[index] = self._next_seq
+                self._timestamps[index] = timestamp_ns
+                self._pyramids[index] = pyramid
+                self._latest = index
+                self._next_seq += 1
+                self.written += 1
+                self._cond.notify_all()
+        return True
+
+    @contextmanager
+    def view(self, age=0):
+        #newest frame (age=0) or an older one, as a read-only view; None if there is no such frame
+        with self._cond:
+            indices = self._ordered()
+            index = indices[age] if age < len(indices) else None
+            frame = self._pin(index) if index is not None else None
+        try:
+            yield frame
+        finally:
+            if frame is not None:
+                self._unpin([index])
+
+    @contextmanager
+    def views(self, count=None):
+        #up to count most recent frames, newest first, all pinned for the duration
+        with self._cond:
+            indices = self._ordered()[:count]
+            frames = [self._pin(index) for index in indices]
+        try:
+            yield frames
+        finally:
+            self._unpin(indices)
+
+    def copy(self, age=0, size=None):
+        #owned frame for handing to a thread that will hold on to it. with size, its image is the
+        #cached upright level (no extra copy); without, a full size copy in sensor orientation
+        with self.view(age) as frame:
+            if frame is None:
+                return None
+            if size is not None:
+                return Frame(frame.level(size), frame.timestamp_ns, frame.seq)
+            return Frame(frame.image.copy(), frame.timestamp_ns, frame.seq, rotate=self.rotate)
+
+    def latest_seq(self):
+        with self._cond:
+            return self._seq[self._latest] if self._latest is not None else 0
+
+    def wait_newer(self, seq, timeout=None):
+        #block until a frame newer than seq arrives; returns the newest seq (unchanged on timeout)
+        with self._cond:
+            self._cond.wait_for(lambda: self._latest is not None and self._seq[self._latest] > seq, timeout)
+            return self._seq[self._latest] if self._latest is not None else 0
+
+    def stats(self):
+        with self._cond:
+            return {
+                'capacity': self.capacity,
+                'frames': len(self._ordered()),
+                'written': self.written,
+                'dropped': self.dropped,
+                'pinned': sum(1 for pins in self._pins if pins),
+            }
+
+    # callers hold self._cond for the helpers below
+
+    def _free_slot(self):
+        #oldest slot that is neither the newest frame nor pinned by a reader
+        candidates = [i for i in range(self.capacity) if i != self._latest and not self._pins[i]]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda i: self._seq[i])
+
+    def _ordered(self):
+        filled = [i for i in range(self.capacity) if self._seq[i]]
+        return sorted(filled, key=lambda i: self._seq[i], reverse=True)
+
+    def _pin(self, index):
+        self._pins[index] += 1
+        pyramid = self._pyramids[index]
+        return Frame(pyramid.image, self._timestamps[index], self._seq[index], pyramid)
+
+    def _unpin(self, indices):
+        with self._cond:
+            for index in indices:
+                self._pins[index] -= 1
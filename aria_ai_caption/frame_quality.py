@@ -0,0 +1,57 @@
+# Picks the sharpest recent frame from a FrameRingBuffer before captioning
+# Sharpness is the variance of the Laplacian on a small grey copy of the frame: motion blur
+# and defocus flatten the edges and the variance drops. Frames are scored on their cached 256px
+# level (~1 ms), and the winner is returned at the size it will be used at, so nothing is copied.
+#
+# Usage (from a worker thread, never the sdk callback, since it waits for new frames):
+#   frame, score = sharpest_frame(observer.frames, wait_budget=0.3)   #frame.image is 512x512 upright
+import time
+
+import cv2
+
+from frame_buffer import Frame
+from preprocess import CAPTION_SIZE, FOLLOW_UP_SIZE
+
+SCORE_SIZE = FOLLOW_UP_SIZE #frames are scored at this pyramid level
+WAIT_BUDGET = 0.3        #seconds to wait for newer, possibly sharper frames
+WINDOW = 0.5             #seconds, frames older than this (vs the newest) are not considered
+GOOD_ENOUGH = 150.0      #stop waiting early once a frame scores this high (None = use the whole budget)
+
+
+def sharpness(image):
+    small = image
+    if image.shape[1] != SCORE_SIZE[0] or image.shape[0] != SCORE_SIZE[1]:
+        small = cv2.resize(image, SCORE_SIZE, interpolation=cv2.INTER_AREA)
+    grey = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    return float(cv2.Laplacian(grey, cv2.CV_64F).var())
+
+
+def sharpest_frame(frames, wait_budget=WAIT_BUDGET, window=WINDOW, good_enough=GOOD_ENOUGH, size=CAPTION_SIZE,
+                   since_seq=0):
+    #returns (sharpest frame as an owned upright image at size, its score), or (None, None) if the
+    #buffer is empty. each frame is scored once; levels are cached, so keeping the best costs nothing.
+    #since_seq: ignore frames up to this seq (e.g. stored before the request), unless nothing newer comes
+    deadline = time.time() + wait_budget
+    scored = set()
+    best, best_score = None, None
+    seq = 0
+    while True:
+        with frames.views() as recent:
+            if recent:
+                seq = recent[0].seq
+                newest_ns = recent[0].timestamp_ns
+            for frame in recent:
+                if frame.seq in scored or newest_ns - frame.timestamp_ns > window * 1e9:
+                    continue
+                stale = frame.seq <= since_seq
+                if stale and (best is not None or recent[0].seq > since_seq):
+                    continue
+                scored.add(frame.seq)
+                score = sharpness(frame.level(SCORE_SIZE))
+                if best_score is None or score > best_score or (best.seq <= since_seq and not stale):
+                    best, best_score = Frame(frame.level(size), frame.timestamp_ns, frame.seq), score
+
+        remaining = deadline - time.time()
+        if remaining <= 0 or (good_enough is not None and best_score is not None and best_score >= good_enough):
+            return best, best_score
+        frames.wait_newer(seq, timeout=remaining)
@@ -0,0 +1,114 @@
+# Headless mode for the assistant clients (aria_server.py, aria_server_caption.py)
+# No window, no preview rendering and no stdin: control comes through signals or a local unix
+# socket, and status is logged as JSON lines (one object per event) instead of console chatter.
+# Progress messages that are plain print() calls (here and in stt, wake_word, ...) go to stderr,
+# so whatever reads stdout only ever gets JSON.
+#
+# Control socket, one command per line, one JSON reply per line:
+#   echo caption | nc -U /tmp/aria_assistant.sock
+#   echo "ask what is in front of me" | nc -U /tmp/aria_assistant.sock
+#   commands: caption, ask <question>, listen, status, quit
+# Signals: SIGUSR1 = caption, SIGUSR2 = listen for a spoken question, SIGINT/SIGTERM = quit
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from datetime import datetime
+
+CONTROL_SOCKET = "/tmp/aria_assistant.sock"
+STATUS_INTERVAL = 30.0 #seconds between status lines in headless mode
+
+# signal -> control command; SIGUSR1/2 don't exist on windows
+SIGNAL_COMMANDS = {
+    getattr(signal, "SIGUSR1", None): "caption",
+    getattr(signal, "SIGUSR2", None): "listen",
+}
+SIGNAL_COMMANDS.pop(None, None)
+
+
+class StatusLog:
+    #human readable lines normally, JSON lines when structured (headless)
+    def __init__(self, structured=False, path=None):
+        self.structured = structured
+        self._out = open(path, "a", buffering=1) if path else sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event, message=None, **fields):
+        if self.structured:
+            record = {'ts': round(time.time(), 3), 'event': event}
+            if message is not None:
+                record['message'] = message
+            record.update(fields)
+            line = json.dumps(record, default=str)
+        else:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            line = f"[{timestamp}]  {message if message is not None else event}"
+        with self._lock:
+            print(line, file=self._out, flush=True)
+
+
+class ControlServer:
+    def __init__(self, path=CONTROL_SOCKET):
+        self.path = path
+        self.commands = {} #name -> fn(argument string) returning something json serialisable
+        self._server = None
+
+    def command(self, name, fn):
+        self.commands[name] = fn
+
+    def dispatch(self, line):
+        name, _, argument = line.strip().partition(" ")
+        fn = self.commands.get(name.lower())
+        if fn is None:
+            return {'ok': False, 'error': f"unknown command {name!r}", 'commands': sorted(self.commands)}
+        try:
+            return {'ok': True, 'result': fn(argument.strip())}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path) #left over from a previous run
+        control = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    line = raw.decode("utf-8", "replace").strip()
+                    if line:
+                        reply = control.dispatch(line)
+                        self.wfile.write((json.dumps(reply, default=str) + "\n").encode("utf-8"))
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self._server.daemon_threads = True
+        os.chmod(self.path, 0o600) #only the user running the assistant can control it
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def dispatch_in_background(self, name):
+        #for signal handlers: commands can take seconds, the handler must return right away
+        threading.Thread(target=self.dispatch, args=(name,), daemon=True).start()
+
+
+def chatter_to_stderr():
+    #call after creating the StatusLog, which keeps writing to the original stdout
+    sys.stdout = sys.stderr
+
+
+def add_arguments(parser):
+    parser.add_argument("--headless", action="store_true",
+                        help="No window or terminal prompts; control via signals or the control socket")
+    parser.add_argument("--control-socket", type=str, default=CONTROL_SOCKET,
+                        help="Unix socket for control commands in headless mode")
+    parser.add_argument("--status-log", type=str, default=None,
+                        help="Append status lines to this file instead of stdout")
@@ -15,44 +15,66 @@ import io
 import threading
 import queue
 import os
+from frame_buffer import FrameRingBuffer
+from display import FrameDisplay
+from scene_change import SceneChangeDetector
+from frame_quality import sharpest_frame
+from motion_state import MotionStateEstimator
+from preprocess import FOLLOW_UP_SIZE
 
 # === Initialize Ollama client ===
 print("Connecting to Ollama...")
 client = Client()
 print("LLaVA (Ollama) client initialized.")
+MODEL_SIZE = (256, 256) #frames are sent to llava at this size
 
 # === Streaming Observer Class ===
 class StreamingObserver:
     def __init__(self):
-        self.last_image = None
+        self.frames = FrameRingBuffer() #last few rgb frames, written by the sdk callback
         self.last_caption_time = 0
-        self.cooldown = 1.5  # seconds between captions
+        #caption when the view changes, at most every 1.5s and at least every 30s
+        self.scene = SceneChangeDetector(min_interval=1.5, max_interval=30)
+        self.sharpest_wait = 0.3 #seconds to wait for a sharper frame before captioning
+        self.motion = MotionStateEstimator() #head motion from the imu stream
+        self.look_pending = False #head settled after moving, caption the new view
         self.caption = "Waiting for image..."
         self.caption_in_progress = False
 
     def on_image_received(self, image: np.ndarray, record: ImageDataRecord):
         if record.camera_id == aria.CameraId.Rgb:
-            self.last_image = np.rot90(image, -1)
+            self.frames.write(image, record.capture_timestamp_ns)
             self.maybe_caption()
 
+    def on_imu_received(self, samples, imu_idx: int):
+        self.motion.update(samples, imu_idx)
+
     def maybe_caption(self):
-        now = time.time()
-        if (
-            self.last_image is not None
-            and not self.caption_in_progress
-            and now - self.last_caption_time >= self.cooldown
-        ):
-            print("Triggering captioning...")
-            self.caption_in_progress = True
-            self.last_caption_time = now
-            threading.Thread(
-                target=self._caption_worker, args=(self.last_image.copy(),)
-            ).start()
-
-    def _caption_worker(self, image):
+        if self.motion.consume_settled():
+            self.look_pending = True
+        #no captions while the head is turning, they come out blurred and about the wrong thing
+        if not self.frames.latest_seq() or self.caption_in_progress or self.motion.is_moving():
+            return
+        with self.frames.view() as frame:
+            if frame is None:
+                return
+            if not self.scene.check(frame.level(FOLLOW_UP_SIZE), force=self.look_pending):
+                return
+        self.look_pending = False
+        print(f"Triggering captioning ({self.scene.last_reason})...")
+        self.caption_in_progress = True
+        self.last_caption_time = time.time()
+        threading.Thread(target=self._caption_worker).start()
+
+    def _caption_worker(self):
         try:
             start = time.time()
-            caption = self.generate_caption(image)
+            #best of the next few frames, so head motion blur doesn't end up in the caption
+            frame, sharpness = sharpest_frame(self.frames, wait_budget=self.sharpest_wait, size=MODEL_SIZE)
+            if frame is None:
+                return
+            print(f"Captioning frame {frame.seq} (sharpness {sharpness:.0f})")
+            caption = self.generate_caption(frame.image)
             duration = time.time() - start
 
             self.caption = caption
@@ -64,9 +86,8 @@ class StreamingObserver:
 
     def generate_caption(self, np_img: np.ndarray) -> str:
         try:
-            # Convert image to PIL and resize
-            image = Image.fromarray(np_img).convert("RGB")
-            image = image.resize((256, 256))
+            #np_img is already the upright MODEL_SIZE pyramid level, only the png encode is left
+            image = Image.fromarray(np_img)
 
             # Encode to base64
             buffer = io.BytesIO()
@@ -116,7 +137,7 @@ aria.set_log_level(aria.Level.Info)
 streaming_client = aria.StreamingClient()
 
 config = streaming_client.subscription_config
-config.subscriber_data_type = aria.StreamingDataType.Rgb
+config.subscriber_data_type = aria.StreamingDataType.Rgb | aria.StreamingDataType.Imu #imu drives caption timing
 config.message_queue_size[aria.StreamingDataType.Rgb] = 1
 
 options = aria.StreamingSecurityOptions()
@@ -150,29 +171,13 @@ streaming_client.subscribe()
 print("Connected to Aria. Streaming started.")
 
 # === OpenCV Display Loop ===
-cv2.namedWindow("Aria RGB + LLaVA Caption", cv2.WINDOW_NORMAL)
-cv2.resizeWindow("Aria RGB + LLaVA Caption", 640, 480)
+display = FrameDisplay(observer.frames, "Aria RGB + LLaVA Caption") #redraws only on new frames
 
 try:
     while True:
-        if observer.last_image is not None:
-            frame = cv2.cvtColor(observer.last_image, cv2.COLOR_RGB2BGR)
-            # Draw caption
-            cv2.putText(
-                frame,
-                observer.caption,
-                (30, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (255, 255, 255),
-                2,
-                cv2.LINE_AA,
-            )
-            cv2.imshow("Aria RGB + LLaVA Caption", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+        display.render(observer.caption)
+        if display.poll_key() == ord("q"):
             break
-        
-        time.sleep(0.01)  # Sleep for 10ms
 
 except KeyboardInterrupt:
     print("\nInterrupted by user.")
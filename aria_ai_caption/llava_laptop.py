@@ -11,20 +11,28 @@ import argparse
 import base64
 import io
 import threading
-import requests
 import queue
 import os
 import sys
+from frame_buffer import FrameRingBuffer
+from display import FrameDisplay
+from caption_client import CaptionClient
+from preprocess import FOLLOW_UP_SIZE
 
 # === Initialize Ollama client ===
 print("Connecting to Ollama...")
 client = Client()
 print("LLaVA (Ollama) client initialized.")
+MODEL_SIZE = (256, 256) #frames are sent to llava at this size
+
+# === Caption server (follow-up questions) ===
+CAPTION_SERVER = "http://10.100.241.227:8000" #change to your caption server address
+caption_client = CaptionClient(CAPTION_SERVER)
 
 # === Streaming Observer Class ===
 class StreamingObserver:
     def __init__(self):
-        self.last_image = None
+        self.frames = FrameRingBuffer() #last few rgb frames, written by the sdk callback
         self.last_caption_time = 0
         self.cooldown = 1.5  # seconds between captions
         self.caption = "Waiting for image..."
@@ -34,22 +42,25 @@ class StreamingObserver:
 
     def on_image_received(self, image: np.ndarray, record: ImageDataRecord):
         if record.camera_id == aria.CameraId.Rgb:
-            self.last_image = np.rot90(image, -1)
+            self.frames.write(image, record.capture_timestamp_ns)
             self.maybe_caption()
 
     def maybe_caption(self):
         now = time.time()
         if (
-            self.last_image is not None
+            self.frames.latest_seq()
             and not self.caption_in_progress
             and not self.tts_in_progress #ensures text to speech is complete
             and now - self.last_caption_time >= self.cooldown
         ):
+            frame = self.frames.copy(size=MODEL_SIZE)
+            if frame is None:
+                return
             print("Triggering captioning...")
             self.caption_in_progress = True
             self.last_caption_time = now
             threading.Thread(
-                target=self._caption_worker, args=(self.last_image.copy(),)
+                target=self._caption_worker, args=(frame.image,)
             ).start()
 
     def _caption_worker(self, image):
@@ -68,9 +79,8 @@ class StreamingObserver:
 
     def generate_caption(self, np_img: np.ndarray) -> str:
         try:
-            # Convert image to PIL and resize
-            image = Image.fromarray(np_img).convert("RGB")
-            image = image.resize((256, 256))
+            #np_img is already the upright MODEL_SIZE pyramid level, only the png encode is left
+            image = Image.fromarray(np_img)
 
             # Encode to base64
             buffer = io.BytesIO()
@@ -88,26 +98,14 @@ class StreamingObserver:
             return f"Exception: {e}"
     
     def ask_follow_up(self, question: str) -> str:
-        if self.last_image is None:
-            return "No image available yet for follow-up."
-
         try:
-            qa_start = time.time()
-            image = Image.fromarray(self.last_image).convert("RGB").resize((256, 256))
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
-
-            files = {'image': ('frame.png', buffer, 'image/png')}
-            data = {'question': question}  # assumes your server accepts this
-
-            response = requests.post("http://10.100.241.227:8000/follow_up", files=files, data=data)
-
-            if response.status_code == 200:
-                print(f"Q&A took {time.time() - qa_start:.2f} seconds")
-                return response.json().get("answer", "No answer returned.")
-            else:
-                return f"Server error: {response.status_code} - {response.text}"
+            #frames are uploaded as 256x256 jpeg over a kept-alive connection
+            with self.frames.view() as frame:
+                if frame is None:
+                    return "No image available yet for follow-up."
+                answer = caption_client.follow_up(question, frame.level(FOLLOW_UP_SIZE))
+            print(f"Q&A took {caption_client.timings['follow_up']['total']:.2f} seconds")
+            return answer
         except Exception as e:
             return f"Exception during follow-up: {e}"
 
@@ -181,8 +179,7 @@ streaming_client.subscribe()
 print("Connected to Aria. Streaming started.")
 
 # === OpenCV Display Loop ===
-cv2.namedWindow("Aria RGB + LLaVA Caption", cv2.WINDOW_NORMAL)
-cv2.resizeWindow("Aria RGB + LLaVA Caption", 640, 480)
+display = FrameDisplay(observer.frames, "Aria RGB + LLaVA Caption") #redraws only on new frames
 
 # === Launch user input thread for follow-up questions ===
 def follow_up_input_loop(observer: StreamingObserver):
@@ -204,25 +201,9 @@ input_thread.start()
 
 try:
     while True:
-        if observer.last_image is not None:
-            frame = cv2.cvtColor(observer.last_image, cv2.COLOR_RGB2BGR)
-            # Draw caption
-            caption_display = observer.caption[:80] + "..." if len(observer.caption) > 80 else observer.caption
-            cv2.putText(
-                frame,
-                caption_display,
-                (30, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (255, 255, 255),
-                2,
-                cv2.LINE_AA,
-            )
-            cv2.imshow("Aria RGB + LLaVA Caption", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+        display.render(observer.caption)
+        if display.poll_key() == ord("q"):
             break
-        
-        time.sleep(0.01)  #sleep for 10ms to reduce cpu load
 
 except KeyboardInterrupt:
     print("\nInterrupted by user.")
@@ -0,0 +1,120 @@
+# Head motion state from the Aria IMU stream, used to time captions
+# The SDK delivers IMU samples in batches (on_imu_received). Each batch is turned into numpy
+# arrays once and processed as a whole: gyro magnitude, smoothed over a few ms, compared against
+# a moving and a still threshold. Timing uses the samples' capture timestamps, not arrival time.
+#
+#   moving  - head turning faster than MOVING_THRESHOLD, captions are suppressed
+#   still   - below STILL_THRESHOLD for at least STILL_SECONDS
+#   settled - one-shot event when the head becomes still after moving (looking at something new)
+#
+# Usage:
+#   motion = MotionStateEstimator()
+#   def on_imu_received(self, samples, imu_idx): motion.update(samples, imu_idx)
+#   if motion.consume_settled(): ...caption now...
+import threading
+import time
+
+import numpy as np
+
+IMU_INDEX = 1            #which imu to follow (aria has two; 1 is the right, 1kHz one)
+MOVING_THRESHOLD = 0.8   #rad/s, roughly a 45 deg/s head turn
+STILL_THRESHOLD = 0.2    #rad/s, below this the head counts as still (walking bob stays above)
+STILL_SECONDS = 0.3      #how long it must stay below STILL_THRESHOLD
+SMOOTHING_SAMPLES = 20   #moving average window over gyro magnitude (~20 ms at 1 kHz)
+STALE_SECONDS = 1.0      #no imu data for this long = unknown state, nothing is suppressed
+
+
+class MotionStateEstimator:
+    def __init__(self, imu_index=IMU_INDEX, moving_threshold=MOVING_THRESHOLD,
+                 still_threshold=STILL_THRESHOLD, still_seconds=STILL_SECONDS,
+                 smoothing=SMOOTHING_SAMPLES):
+        self.imu_index = imu_index
+        self.moving_threshold = moving_threshold
+        self.still_threshold = still_threshold
+        self.still_ns = int(still_seconds * 1e9)
+        self.smoothing = smoothing
+
+        self._tail = np.zeros(0) #last smoothing-1 magnitudes, so the average spans batches
+        self._latest_ns = None   #newest sample timestamp
+        self._last_update = None #time.monotonic() of the last batch
+        self._still_since_ns = None #start of the current run below still_threshold
+        self._last_moving_ns = None
+        self._moved = False      #moved since the last settled event
+        self._settled = False    #pending settled event
+        self._peak = 0.0         #highest smoothed angular speed since the last stats() call
+        self._lock = threading.Lock()
+
+    def update(self, samples, imu_idx=None):
+        #samples: batch of MotionData from on_imu_received
+        if (imu_idx is not None and imu_idx != self.imu_index) or not samples:
+            return
+        timestamps = np.fromiter((s.capture_timestamp_ns for s in samples), dtype=np.int64, count=len(samples))
+        gyro = np.array([s.gyro_radsec for s in samples], dtype=np.float64)
+        speed = np.linalg.norm(gyro, axis=1)
+
+        with self._lock:
+            #moving average over the batch plus the tail of the previous one
+            joined = np.concatenate((self._tail, speed))
+            window = min(self.smoothing, len(joined))
+            smoothed = np.convolve(joined, np.ones(window) / window, mode="valid")[-len(speed):]
+            self._tail = joined[-(self.smoothing - 1):] if self.smoothing > 1 else np.zeros(0)
+            if len(smoothed) < len(speed): #first few samples ever, not enough history to average
+                smoothed = np.concatenate((speed[:len(speed) - len(smoothed)], smoothed))
+
+            moving = np.flatnonzero(smoothed > self.moving_threshold)
+            if len(moving):
+                self._last_moving_ns = int(timestamps[moving[-1]])
+                self._moved = True
+
+            not_still = np.flatnonzero(smoothed >= self.still_threshold)
+            if len(not_still):
+                last = not_still[-1]
+                self._still_since_ns = int(timestamps[last + 1]) if last + 1 < len(timestamps) else None
+            elif self._still_since_ns is None:
+                self._still_since_ns = int(timestamps[0])
+
+            self._latest_ns = int(timestamps[-1])
+            self._last_update = time.monotonic()
+            self._peak = max(self._peak, float(smoothed.max()))
+            if self._moved and self._is_still():
+                self._moved = False
+                self._settled = True
+
+    def is_moving(self):
+        #True while the head is turning (or just was, within STILL_SECONDS)
+        with self._lock:
+            return self._is_moving()
+
+    def is_still(self):
+        with self._lock:
+            return self._stale() or self._is_still()
+
+    def consume_settled(self):
+        #True once after each move -> still transition
+        with self._lock:
+            settled, self._settled = self._settled, False
+            return settled
+
+    def stats(self):
+        with self._lock:
+            peak, self._peak = self._peak, 0.0
+            return {
+                'moving': self._is_moving(),
+                'still': self._stale() or self._is_still(),
+                'peak_speed': round(peak, 3),
+            }
+
+    # callers hold self._lock for the helpers below
+
+    def _is_moving(self):
+        if self._stale() or self._last_moving_ns is None:
+            return False
+        return self._latest_ns - self._last_moving_ns < self.still_ns
+
+    def _is_still(self):
+        return (self._still_since_ns is not None and self._latest_ns is not None
+                and self._latest_ns - self._still_since_ns >= self.still_ns)
+
+    def _stale(self):
+        #imu timestamps are on the device clock, so staleness is judged by arrival time instead
+        return self._last_update is None or time.monotonic() - self._last_update > STALE_SECONDS
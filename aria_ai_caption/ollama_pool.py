@@ -0,0 +1,220 @@
+# Pool of Ollama backends for caption_server.py
+# Requests go to the healthy backend with the fewest outstanding requests. A background
+# thread probes every backend; backends that fail repeatedly, or get much slower than they
+# usually are, are ejected for a while and only come back after a successful probe.
+# Only transport failures (connection errors, timeouts, 5xx from ollama) count against a
+# backend; a 4xx caused by the request, or an error in the caller's own code, does not.
+# Latency is judged against the backend's own baseline, since backends may run different
+# models and see a different mix of captions and follow-ups.
+#
+# Usage:
+#   pool = BackendPool.from_config([{'host': 'http://gpu1:11434'}, {'host': 'http://gpu2:11434', 'model': 'llava'}])
+#   with pool.lease() as backend:
+#       backend.client.generate(model=backend.model or default_model, ...)
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from ollama import Client, ResponseError
+
+PROBE_INTERVAL = 10.0 #seconds between health probes
+PROBE_TIMEOUT = 2.0   #seconds before a probe counts as failed
+MAX_FAILURES = 3      #consecutive failures before a backend is ejected
+EJECT_SECONDS = 30.0  #minimum time an ejected backend sits out
+SLOW_FACTOR = 3.0     #ejected when its recent average latency is this many times its own baseline
+BASELINE_SAMPLES = 20 #requests before the baseline is trusted enough to eject on
+BASELINE_WEIGHT = 0.02 #how fast the baseline follows, much slower than the recent average (0.2)
+
+
+class Backend:
+    def __init__(self, host, model=None, max_in_flight=1, name=None):
+        self.host = host
+        self.model = model #None = use the server's default model
+        self.max_in_flight = max_in_flight
+        self.name = name or host
+        self.client = Client(host=host)
+        self.probe_client = Client(host=host, timeout=PROBE_TIMEOUT)
+
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.avg_latency = None #moving average of request wall time, seconds
+        self.baseline_latency = None #slow moving average of the same, what this backend usually takes
+        self.latency_samples = 0
+        self.ejected_until = 0.0
+        self.healthy = True
+        self.last_error = None
+        self.warmup_seconds = None
+
+    def available(self, now):
+        return self.healthy and now >= self.ejected_until
+
+    def stats(self):
+        return {
+            'host': self.host,
+            'model': self.model,
+            'healthy': self.healthy,
+            'ejected': time.time() < self.ejected_until,
+            'outstanding': self.outstanding,
+            'max_in_flight': self.max_in_flight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_latency': round(self.avg_latency, 3) if self.avg_latency is not None else None,
+            'baseline_latency': round(self.baseline_latency, 3) if self.baseline_latency is not None else None,
+            'warmup_seconds': self.warmup_seconds,
+            'last_error': self.last_error,
+        }
+
+
+def is_transport_error(error):
+    #failures that say something about the backend rather than about the request
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
+
+
+class BackendPool:
+    def __init__(self, backends):
+        if not backends:
+            raise ValueError("Backend pool needs at least one backend")
+        self.backends = backends
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        #config is a list of dicts (host, model, max_in_flight, name) or a path to a json file with one
+        if isinstance(config, str):
+            with open(config) as f:
+                config = json.load(f)
+        return cls([Backend(**entry) for entry in config])
+
+    def capacity(self):
+        return sum(b.max_in_flight for b in self.backends)
+
+    def models(self, default=None):
+        #distinct models the pool serves (default for backends without one), available backends first
+        now = time.time()
+        with self._lock:
+            backends = sorted(self.backends, key=lambda b: not b.available(now))
+            return list(dict.fromkeys(b.model or default for b in backends))
+
+    def get(self, name):
+        for backend in self.backends:
+            if backend.name == name:
+                return backend
+        return None
+
+    def pick(self, prefer=None):
+        #least outstanding requests, ties go to the lower average latency
+        now = time.time()
+        with self._lock:
+            preferred = self.get(prefer) if prefer else None
+            if preferred is not None and preferred.available(now):
+                backend = preferred
+            else:
+                candidates = [b for b in self.backends if b.available(now)]
+                if not candidates:
+                    #everything is down or ejected: still try rather than refuse the request
+                    candidates = self.backends
+                backend = min(
+                    candidates,
+                    key=lambda b: (b.outstanding / b.max_in_flight,
+                                   b.avg_latency if b.avg_latency is not None else 0.0),
+                )
+            backend.outstanding += 1
+            return backend
+
+    @contextmanager
+    def lease(self, prefer=None):
+        #prefer: backend name to use if it is available (e.g. the one holding an ollama context)
+        backend = self.pick(prefer)
+        start = time.time()
+        try:
+            yield backend
+        except Exception as e:
+            if is_transport_error(e):
+                self._record_failure(backend, e)
+            else:
+                with self._lock:
+                    backend.requests += 1
+            raise
+        else:
+            self._record_success(backend, time.time() - start)
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def start_health_checks(self, interval=PROBE_INTERVAL):
+        if self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._probe_loop, args=(interval,), daemon=True)
+            self._probe_thread.start()
+
+    def probe(self, backend):
+        try:
+            backend.probe_client.list()
+        except Exception as e:
+            with self._lock:
+                backend.healthy = False
+                backend.last_error = f"probe: {e}"
+            return False
+        with self._lock:
+            #ejected backends stay out until their time is up and a probe succeeds
+            if time.time() >= backend.ejected_until:
+                backend.healthy = True
+                backend.consecutive_failures = 0
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {backend.name: backend.stats() for backend in self.backends}
+
+    def _probe_loop(self, interval):
+        while True:
+            for backend in self.backends:
+                self.probe(backend)
+            time.sleep(interval)
+
+    def _record_success(self, backend, latency):
+        with self._lock:
+            backend.requests += 1
+            backend.consecutive_failures = 0
+            if backend.avg_latency is None:
+                backend.avg_latency = latency
+            else:
+                backend.avg_latency = 0.8 * backend.avg_latency + 0.2 * latency
+
+            #eject backends that got much slower than they usually are, as long as another is left
+            baseline = backend.baseline_latency
+            others = [b for b in self.backends if b is not backend and b.available(time.time())]
+            if (others and baseline is not None and backend.latency_samples >= BASELINE_SAMPLES
+                    and backend.avg_latency > SLOW_FACTOR * baseline):
+                self._eject(backend, f"slow: {backend.avg_latency:.2f}s average, usually {baseline:.2f}s")
+                return
+
+            backend.latency_samples += 1
+            if baseline is None:
+                backend.baseline_latency = latency
+            else:
+                backend.baseline_latency = (1 - BASELINE_WEIGHT) * baseline + BASELINE_WEIGHT * latency
+
+    def _record_failure(self, backend, error):
+        with self._lock:
+            backend.requests += 1
+            backend.errors += 1
+            backend.consecutive_failures += 1
+            backend.last_error = str(error)
+            if backend.consecutive_failures >= MAX_FAILURES:
+                self._eject(backend, f"{backend.consecutive_failures} consecutive failures")
+
+    def _eject(self, backend, reason):
+        backend.ejected_until = time.time() + EJECT_SECONDS
+        backend.healthy = False
+        #the recent average restarts once it is back, otherwise it could be ejected again right
+        #away; the baseline is kept so it is still judged against its usual speed
+        backend.avg_latency = None
+        backend.last_error = f"ejected ({reason})"
+        print(f"Ejecting Ollama backend {backend.name}: {reason}")
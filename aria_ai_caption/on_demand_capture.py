@@ -0,0 +1,97 @@
+# On-demand RGB capture for clients that only look at the scene when asked (aria_server.py)
+# The stream stays subscribed, but while idle only a trickle of frames (idle_fps) is stored, so
+# the SDK callback, the ring buffer copy, the pyramid levels and the preview all run at that rate
+# instead of the full stream rate. A request switches to full rate, waits for a frame captured
+# after the request started, and stays at full rate for LINGER_SECONDS after it finishes so a
+# quick follow-up still has fresh frames. Time from request to first fresh frame is measured.
+#
+# Usage:
+#   capture = OnDemandCapture(observer.frames, idle_fps=1)
+#   def on_image_received(self, image, record): capture.on_frame(image, record.capture_timestamp_ns)
+#   with capture.active():              #around a caption / question
+#       if capture.wait_fresh():        #False = timed out, only older frames available
+#           ...frames newer than capture.since_seq...
+import threading
+import time
+from contextlib import contextmanager
+
+IDLE_FPS = 1.0        #frames stored per second while idle (0 = none, pull a fresh one per request)
+LINGER_SECONDS = 2.0  #stay at full rate this long after the last request ends
+FRESH_TIMEOUT = 2.0   #seconds to wait for a frame captured after the request started
+
+
+class OnDemandCapture:
+    def __init__(self, frames, idle_fps=IDLE_FPS, linger=LINGER_SECONDS):
+        self.frames = frames
+        self.idle_interval = 1.0 / idle_fps if idle_fps else None
+        self.linger = linger
+        self.since_seq = 0 #newest seq when the current request went active; later frames are fresh
+
+        self.stored = 0
+        self.skipped = 0 #frames delivered by the sdk but not stored (idle)
+        self.requests = 0
+        self.time_to_fresh = [] #seconds from request to first fresh frame, most recent last
+        self._active = 0
+        self._linger_until = 0.0
+        self._last_stored = 0.0
+        self._request_start = None #perf_counter() of the request still waiting for a fresh frame
+        self._lock = threading.Lock()
+
+    def on_frame(self, image, timestamp_ns):
+        #sdk callback thread; returns True if the frame was stored
+        now = time.monotonic()
+        with self._lock:
+            full_rate = self._active or now < self._linger_until
+            if not full_rate and self.frames.latest_seq():
+                if self.idle_interval is None or now - self._last_stored < self.idle_interval:
+                    self.skipped += 1
+                    return False
+            self._last_stored = now
+        if not self.frames.write(image, timestamp_ns):
+            return False
+        with self._lock:
+            self.stored += 1
+            if self._request_start is not None:
+                self._record(time.perf_counter() - self._request_start)
+        return True
+
+    @contextmanager
+    def active(self):
+        #full rate for the duration (plus linger); nests, e.g. listen -> caption
+        with self._lock:
+            if not self._active:
+                self.requests += 1
+                self.since_seq = self.frames.latest_seq()
+                self._request_start = time.perf_counter()
+            self._active += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._active -= 1
+                if not self._active:
+                    self._request_start = None #no fresh frame came, nothing to measure
+                    self._linger_until = time.monotonic() + self.linger
+
+    def wait_fresh(self, timeout=FRESH_TIMEOUT):
+        #block until a frame newer than since_seq is stored; call inside active()
+        return self.frames.wait_newer(self.since_seq, timeout=timeout) > self.since_seq
+
+    def stats(self):
+        with self._lock:
+            recent = self.time_to_fresh[-20:]
+            return {
+                'mode': "active" if self._active or time.monotonic() < self._linger_until else "idle",
+                'stored': self.stored,
+                'skipped': self.skipped,
+                'requests': self.requests,
+                'time_to_fresh_last': round(recent[-1], 3) if recent else None,
+                'time_to_fresh_mean': round(sum(recent) / len(recent), 3) if recent else None,
+            }
+
+    # callers hold self._lock for the helper below
+
+    def _record(self, seconds):
+        self.time_to_fresh.append(seconds)
+        del self.time_to_fresh[:-100]
+        self._request_start = None
@@ -0,0 +1,80 @@
+# Frame preprocessing shared by every consumer of Aria RGB frames
+# prepare() downscales with INTER_AREA straight from the sensor frame and only then rotates it
+# upright, so rotation and colour handling run on target-sized pixels instead of 1408x1408.
+# Aspect ratio is kept: the frame is centre cropped to the target shape, or letterboxed.
+#
+# FramePyramid caches the sizes a frame is used at (display, 512 for captions, 256 for follow-ups
+# and scoring). Each level is computed once, from the smallest level already cached that is big
+# enough, and then shared read-only by everyone who asks for it.
+#
+# Usage:
+#   small = prepare(image, (512, 512))                   #upright RGB, 512x512
+#   pyramid = FramePyramid(image)
+#   pyramid.get(CAPTION_SIZE), pyramid.get(FOLLOW_UP_SIZE)
+import threading
+
+import cv2
+import numpy as np
+
+# the levels frames are used at; anything else works too, these are just the ones everyone shares
+DISPLAY_SIZE = (640, 640)   #preview window
+CAPTION_SIZE = (512, 512)   #what the caption model sees
+FOLLOW_UP_SIZE = (256, 256) #follow-up questions, sharpness and scene change scoring
+
+LETTERBOX = False #False = centre crop to the target aspect ratio, True = pad with black
+
+
+def prepare(image, size, rotate=True, letterbox=LETTERBOX, interpolation=cv2.INTER_AREA):
+    #image: HxWx3 RGB as delivered by the sdk (rotated 90 degrees when rotate=True)
+    #returns a new upright RGB array of size (width, height)
+    width, height = size
+    #work in source orientation: the target seen before the final clockwise rotation
+    target_w, target_h = (height, width) if rotate else (width, height)
+    src_h, src_w = image.shape[:2]
+
+    scale = min(target_w / src_w, target_h / src_h) if letterbox else max(target_w / src_w, target_h / src_h)
+    if not letterbox:
+        #centre crop the source to the target aspect ratio (a view, nothing is copied)
+        crop_w, crop_h = min(src_w, round(target_w / scale)), min(src_h, round(target_h / scale))
+        x, y = (src_w - crop_w) // 2, (src_h - crop_h) // 2
+        image = image[y:y + crop_h, x:x + crop_w]
+        small = cv2.resize(image, (target_w, target_h), interpolation=interpolation)
+    else:
+        fit_w, fit_h = max(1, round(src_w * scale)), max(1, round(src_h * scale))
+        small = np.zeros((target_h, target_w, 3), dtype=image.dtype)
+        x, y = (target_w - fit_w) // 2, (target_h - fit_h) // 2
+        small[y:y + fit_h, x:x + fit_w] = cv2.resize(image, (fit_w, fit_h), interpolation=interpolation)
+
+    if rotate:
+        small = cv2.rotate(small, cv2.ROTATE_90_CLOCKWISE) #same as np.rot90(image, -1)
+    return small
+
+
+class FramePyramid:
+    def __init__(self, image, rotate=True, letterbox=LETTERBOX):
+        self.image = image #source frame, as delivered
+        self.rotate = rotate
+        self.letterbox = letterbox
+        self._levels = {} #(width, height) -> upright RGB, read-only
+        self._lock = threading.Lock()
+
+    def get(self, size):
+        size = tuple(size)
+        with self._lock:
+            level = self._levels.get(size)
+            if level is None:
+                #downscale from the smallest cached level that is still at least as big
+                larger = [s for s in self._levels if s[0] >= size[0] and s[1] >= size[1]
+                          and s[0] * size[1] == s[1] * size[0]]
+                if larger:
+                    source = self._levels[min(larger)]
+                    level = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+                else:
+                    level = prepare(self.image, size, rotate=self.rotate, letterbox=self.letterbox)
+                level.flags.writeable = False
+                self._levels[size] = level
+            return level
+
+    def cached(self):
+        with self._lock:
+            return sorted(self._levels)
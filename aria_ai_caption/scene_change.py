@@ -0,0 +1,73 @@
+# Scene change detection for deciding when a new caption is worth generating
+# Each frame is shrunk to a tiny grid of grey block means (a few hundred pixels, ~1 ms), and
+# compared against the grid of the last captioned frame. Captions fire when enough of the view
+# has changed, never more often than min_interval, and at least every max_interval as a refresh.
+#
+# Usage:
+#   scene = SceneChangeDetector(min_interval=1.5, max_interval=30)
+#   if scene.check(frame.level((256, 256))):   #True = caption this frame (it becomes the new reference)
+#       ...
+import time
+
+import cv2
+import numpy as np
+
+GRID = (16, 16)         #block means compared per frame
+MIN_INTERVAL = 1.5      #seconds, never caption more often than this
+MAX_INTERVAL = 30.0     #seconds, caption anyway after this long (None = only on change)
+CHANGE_THRESHOLD = 0.3  #mean block difference, in units of the frame's contrast, that counts as a new scene; lower = more sensitive
+MIN_CONTRAST = 0.02     #contrast floor, so a dark or flat frame (lens covered) doesn't blow its noise up into a change
+
+
+class SceneChangeDetector:
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, threshold=CHANGE_THRESHOLD, grid=GRID):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.grid = grid
+        self.reference = None #signature of the last captioned frame
+        self.reference_time = 0.0
+        self.last_score = None
+        self.last_reason = None #why the last check fired: first, changed or refresh
+
+    def signature(self, image):
+        #rgb frame -> grid of grey block means, normalised for brightness (offset) and contrast
+        #(gain), so auto exposure brightening or darkening the same view isn't a change
+        small = cv2.resize(image, self.grid, interpolation=cv2.INTER_AREA)
+        grey = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY).astype(np.float32) / 255.0
+        return (grey - grey.mean()) / max(float(grey.std()), MIN_CONTRAST)
+
+    def score(self, signature):
+        #0 = same scene as the reference, larger = more of the view changed
+        if self.reference is None:
+            return 1.0
+        return float(np.abs(signature - self.reference).mean())
+
+    def check(self, image, now=None, force=False):
+        #force: caption this frame whatever the score (still subject to min_interval)
+        now = time.time() if now is None else now
+        elapsed = now - self.reference_time
+        if self.reference is not None and elapsed < self.min_interval:
+            return False #too soon, don't even look at the frame
+
+        signature = self.signature(image)
+        self.last_score = self.score(signature)
+        if self.reference is None:
+            reason = "first"
+        elif force:
+            reason = "forced"
+        elif self.last_score >= self.threshold:
+            reason = "changed"
+        elif self.max_interval is not None and elapsed >= self.max_interval:
+            reason = "refresh"
+        else:
+            return False
+
+        self.reference = signature
+        self.reference_time = now
+        self.last_reason = reason
+        return True
+
+    def reset(self):
+        #next check fires regardless of the scene
+        self.reference = None
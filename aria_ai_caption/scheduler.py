@@ -0,0 +1,147 @@
+# Priority scheduler for caption_server.py
+# Generations run through a fixed number of slots. Waiting requests are served by priority
+# (spoken/typed follow-ups before automatic captions), then in arrival order. A queued
+# background caption is cancelled as soon as a newer frame arrives from the same client,
+# since nobody wants a caption of where they were looking a few seconds ago.
+# With max_queue set, a request that would have to wait behind max_queue others is refused
+# right away (QueueFull, with a retry-after estimate) instead of piling onto the model.
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE = 0 #follow-up questions
+BACKGROUND = 1  #periodic captions
+DEFAULT_SLOT_SECONDS = 2.5 #assumed time a generation holds a slot, until there are measurements
+
+
+class Superseded(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, priority, seq, client_id):
+        self.priority = priority
+        self.seq = seq
+        self.client_id = client_id
+        self.enqueued_at = time.time()
+        self.queue_wait = 0.0
+        self.started_at = None
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class PriorityScheduler:
+    def __init__(self, max_in_flight=1, max_queue=None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue #waiting requests before new ones are refused, None = no limit
+        self.in_flight = 0
+        self.superseded = 0
+        self.rejected = 0
+        self.avg_slot_seconds = DEFAULT_SLOT_SECONDS
+        self._queue = [] #heap of waiting tickets
+        self._pending_captions = {} #client_id -> queued background ticket
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def check(self, priority, client_id=None):
+        #raises QueueFull if a request arriving now would be refused, without queueing it
+        with self._cond:
+            self._admit(priority, client_id)
+
+    def acquire(self, priority, client_id=None):
+        with self._cond:
+            self._admit(priority, client_id)
+            ticket = Ticket(priority, next(self._counter), client_id)
+            if priority == BACKGROUND and client_id is not None:
+                older = self._pending_captions.get(client_id)
+                if older is not None:
+                    older.cancelled = True
+                    self.superseded += 1
+                self._pending_captions[client_id] = ticket
+            heapq.heappush(self._queue, ticket)
+            self._cond.notify_all()
+
+            while True:
+                self._drop_cancelled()
+                if ticket.cancelled:
+                    raise Superseded("Superseded by a newer frame from the same client")
+                if self.in_flight < self.max_in_flight and self._queue[0] is ticket:
+                    break
+                self._cond.wait()
+
+            heapq.heappop(self._queue)
+            if self._pending_captions.get(client_id) is ticket:
+                del self._pending_captions[client_id]
+            self.in_flight += 1
+            ticket.started_at = time.time()
+            ticket.queue_wait = ticket.started_at - ticket.enqueued_at
+            return ticket
+
+    def release(self, ticket=None):
+        with self._cond:
+            self.in_flight -= 1
+            if ticket is not None:
+                #moving average of how long a slot is held, for retry_after
+                held = time.time() - ticket.started_at
+                self.avg_slot_seconds = 0.8 * self.avg_slot_seconds + 0.2 * held
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority, client_id=None):
+        ticket = self.acquire(priority, client_id)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def retry_after(self):
+        #rough seconds until a new arrival would get a slot
+        with self._cond:
+            return self._retry_after()
+
+    def stats(self):
+        with self._cond:
+            waiting = [t for t in self._queue if not t.cancelled]
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'waiting_interactive': sum(t.priority == INTERACTIVE for t in waiting),
+                'waiting_background': sum(t.priority == BACKGROUND for t in waiting),
+                'max_queue': self.max_queue,
+                'superseded': self.superseded,
+                'rejected': self.rejected,
+                'avg_slot_seconds': round(self.avg_slot_seconds, 3),
+            }
+
+    def _admit(self, priority, client_id):
+        #called with the lock held. A newer caption from a client that already has one queued
+        #takes that one's place, so it never makes the queue longer
+        if self.max_queue is None or self.in_flight < self.max_in_flight:
+            return
+        waiting = sum(not t.cancelled for t in self._queue)
+        if priority == BACKGROUND and client_id is not None and client_id in self._pending_captions:
+            waiting -= 1
+        if waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(self._retry_after())
+
+    def _retry_after(self):
+        ahead = sum(not t.cancelled for t in self._queue) + self.in_flight + 1
+        return max(1, math.ceil(ahead / self.max_in_flight * self.avg_slot_seconds))
+
+    def _drop_cancelled(self):
+        #cancelled tickets are removed lazily once they reach the front of the heap
+        while self._queue and self._queue[0].cancelled:
+            heapq.heappop(self._queue)
+            self._cond.notify_all()
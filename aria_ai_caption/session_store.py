@@ -0,0 +1,62 @@
+# Per-frame sessions for caption_server.py
+# /caption hands back a frame_id. The preprocessed image and the ollama context from that
+# caption are kept here so /follow_up can take the frame_id instead of a new upload.
+# Bounded: least recently used sessions are evicted past capacity, and sessions expire after ttl.
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class Session:
+    def __init__(self, image_hash, image_b64=None, context=None, data=None, mimetype=None, backend=None):
+        self.image_hash = image_hash
+        self.image_b64 = image_b64 #base64 image as sent to ollama
+        self.context = context #ollama context tokens from the caption of this frame
+        #raw upload, kept when the caption came from the cache and nothing was preprocessed yet
+        self.data = data
+        self.mimetype = mimetype
+        self.backend = backend #name of the ollama backend that holds the context
+        self.created_at = time.time()
+        #guards the fields above: follow-ups on the same frame run concurrently, and the first
+        #one to need the image decodes the raw upload into image_b64
+        self.lock = threading.Lock()
+
+
+class SessionStore:
+    def __init__(self, capacity=64, ttl=120.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.evicted = 0
+        self._sessions = OrderedDict() #frame_id -> Session
+        self._lock = threading.Lock()
+
+    def create(self, image_hash, **kwargs):
+        frame_id = uuid.uuid4().hex[:16]
+        with self._lock:
+            self._sessions[frame_id] = Session(image_hash, **kwargs)
+            while len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        return frame_id
+
+    def get(self, frame_id):
+        with self._lock:
+            session = self._sessions.get(frame_id)
+            if session is None:
+                return None
+            if time.time() - session.created_at > self.ttl:
+                del self._sessions[frame_id]
+                self.evicted += 1
+                return None
+            self._sessions.move_to_end(frame_id)
+            return session
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._sessions),
+                'capacity': self.capacity,
+                'ttl': self.ttl,
+                'evicted': self.evicted,
+            }
@@ -0,0 +1,61 @@
+# In-flight request coalescing for caption_server.py
+# When a client times out and retries, the retry carries the same image and prompt as the
+# generation that is still running. Instead of starting a second one, the duplicate waits
+# for the first and gets the same result (or the same error).
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self.leaders = 0 #calls that actually ran
+        self.coalesced = 0 #duplicate calls that shared a result
+        self._calls = {} #key -> _Call
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        #returns (result of fn, True if it was shared with an earlier identical call)
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            #KeyboardInterrupt, SystemExit... too: a waiter must get a result or an error, never None
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'waiting_duplicates': sum(call.waiters for call in self._calls.values()),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+            }
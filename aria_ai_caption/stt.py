@@ -0,0 +1,180 @@
+# Speech to text backends behind one interface
+#   whisper         - openai-whisper, pytorch fp32 on cpu (the original setup)
+#   faster-whisper  - the same whisper weights on CTranslate2, int8 quantised on cpu; several times
+#                     faster per transcription at about the same accuracy
+# Both take the in-memory float32 16 kHz arrays from audio.py and return whisper's result shape
+# ({'text': ...}), so audio.transcribe() works with either. Only the chosen backend's package
+# has to be installed. Pick one here or with environment variables:
+#   ARIA_STT_BACKEND=faster-whisper ARIA_STT_MODEL=base ARIA_STT_COMPUTE_TYPE=int8 ARIA_STT_THREADS=4
+# test_programs/stt_benchmark.py compares backends (real time factor and word error rate).
+#
+# Models are shared process wide through get_model(): each configuration is loaded once, on first
+# use, and wake word detection and question transcription get the same instance. preload() starts
+# that load on a background thread, e.g. while the glasses connect. stats() reports load time and
+# resident memory. A shared model transcribes one recording at a time: openai-whisper keeps
+# decoding state on the model, so two threads in one model would clobber each other, and the
+# wake word listener and question transcription run on different threads.
+#
+# Usage:
+#   preload()                                               #at startup, returns right away
+#   text = audio.transcribe(get_model(), recording, fs)     #waits for the load if still running
+#   stt_model = load_backend("faster-whisper", "small", compute_type="int8", threads=4)   #unshared
+import os
+import sys
+import threading
+import time
+
+BACKEND = os.environ.get("ARIA_STT_BACKEND", "whisper")            #"whisper" or "faster-whisper"
+MODEL_SIZE = os.environ.get("ARIA_STT_MODEL", "base")              #"tiny", "base", "small", "medium", ...
+COMPUTE_TYPE = os.environ.get("ARIA_STT_COMPUTE_TYPE", "int8")     #faster-whisper only: int8, int8_float32, float32
+CPU_THREADS = int(os.environ.get("ARIA_STT_THREADS", "0"))         #0 = library default
+DEVICE = "cpu"
+
+
+class WhisperBackend:
+    name = "whisper"
+
+    def __init__(self, model_size=MODEL_SIZE, device=DEVICE, threads=CPU_THREADS):
+        import torch
+        import whisper
+        if threads:
+            torch.set_num_threads(threads) #process wide, torch has no per model setting
+        self.model_size = model_size
+        self.compute_type = "float32"
+        self.model = whisper.load_model(model_size, device=device)
+        self.lock = threading.Lock() #one transcription at a time
+
+    def transcribe(self, audio, **options):
+        options.setdefault("fp16", False) #no fp16 on cpu, saves the warning
+        with self.lock:
+            return self.model.transcribe(audio, **options)
+
+
+class FasterWhisperBackend:
+    name = "faster-whisper"
+
+    def __init__(self, model_size=MODEL_SIZE, device=DEVICE, compute_type=COMPUTE_TYPE, threads=CPU_THREADS):
+        from faster_whisper import WhisperModel
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.model = WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=threads)
+        self.lock = threading.Lock() #one transcription at a time, like WhisperBackend
+
+    def transcribe(self, audio, **options):
+        options.pop("fp16", None) #openai-whisper option, compute type is fixed at load time here
+        options.setdefault("beam_size", 1) #greedy, like openai-whisper's default
+        with self.lock:
+            segments, info = self.model.transcribe(audio, **options)
+            segments = list(segments) #a generator; decoding happens while it is consumed
+        return {
+            'text': "".join(segment.text for segment in segments),
+            'language': info.language,
+            'segments': segments,
+        }
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def load_backend(name=BACKEND, model_size=MODEL_SIZE, compute_type=COMPUTE_TYPE, threads=CPU_THREADS, device=DEVICE):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend {name!r}, use one of {sorted(BACKENDS)}")
+    start = time.perf_counter()
+    if name == FasterWhisperBackend.name:
+        backend = FasterWhisperBackend(model_size, device=device, compute_type=compute_type, threads=threads)
+    else:
+        backend = WhisperBackend(model_size, device=device, threads=threads)
+    backend.load_seconds = time.perf_counter() - start
+    return backend
+
+
+def rss_bytes():
+    #resident memory of this process. linux: current; macOS has no /proc, so the peak instead
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024 #bytes on macOS, KiB on linux
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}  #key -> backend
+        self._loading = {} #key -> Event set when that load finishes (or fails)
+        self._errors = {}  #key -> exception of the last failed load
+        self._stats = {}   #key -> load stats
+        self._lock = threading.Lock()
+
+    def get(self, name=BACKEND, model_size=MODEL_SIZE, compute_type=COMPUTE_TYPE, threads=CPU_THREADS):
+        #the shared model for this configuration; the first caller loads it, concurrent callers wait
+        key = (name, model_size, compute_type if name == FasterWhisperBackend.name else "float32", threads)
+        with self._lock:
+            if key in self._models:
+                return self._models[key]
+            done = self._loading.get(key)
+            leader = done is None
+            if leader:
+                done = self._loading[key] = threading.Event()
+                self._errors.pop(key, None)
+
+        if not leader:
+            done.wait()
+            with self._lock:
+                if key in self._models:
+                    return self._models[key]
+                raise self._errors[key]
+
+        try:
+            before = rss_bytes()
+            print(f"Loading STT model {name} {model_size}...")
+            model = load_backend(name, model_size, compute_type=compute_type, threads=threads)
+            stats = {
+                'backend': name,
+                'model': model_size,
+                'compute_type': model.compute_type,
+                'load_seconds': round(model.load_seconds, 2),
+                'rss_delta_mb': round((rss_bytes() - before) / 2**20, 1), #approximate if other loads overlap
+            }
+            print(f"STT model loaded in {model.load_seconds:.1f}s (+{stats['rss_delta_mb']} MB resident).")
+            with self._lock:
+                self._models[key] = model
+                self._stats[key] = stats
+            return model
+        except Exception as e:
+            with self._lock:
+                self._errors[key] = e
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+            done.set()
+
+    def preload(self, *args, **kwargs):
+        #start loading on a daemon thread; get() with the same settings picks up the result
+        def load():
+            try:
+                self.get(*args, **kwargs)
+            except Exception as e:
+                print(f"STT model preload failed: {e}")
+        thread = threading.Thread(target=load, daemon=True, name="stt-preload")
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rss_mb': round(rss_bytes() / 2**20, 1),
+                'models': list(self._stats.values()),
+                'loading': [f"{key[0]} {key[1]}" for key in self._loading],
+            }
+
+
+registry = ModelRegistry()
+get_model = registry.get
+preload = registry.preload
+stats = registry.stats
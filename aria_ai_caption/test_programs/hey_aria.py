@@ -2,12 +2,14 @@
 import whisper
 import sounddevice as sd
 import numpy as np
-import tempfile
 import os
+import sys
 import time
-import scipy.io.wavfile as wavfile
 from rapidfuzz import fuzz
 
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import audio #64 kHz recordings are resampled to 16 kHz in memory
+
 model = whisper.load_model("base")  
 
 WAKE_PHRASES = ["hey aria", "hey area", "hey arya"]
@@ -18,16 +20,12 @@ def is_wake_phrase(text, phrases=WAKE_PHRASES, threshold=THRESHOLD):
 
 def record_chunk(duration=2, fs=64000):
     print("Listening...")
-    audio = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
+    recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
     sd.wait()
-    return audio, fs
-
-def transcribe(audio, fs):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-        wavfile.write(f.name, fs, audio)
-        result = model.transcribe(f.name)
-        os.remove(f.name)
-        return result["text"]
+    return recording, fs
+
+def transcribe(recording, fs):
+    return audio.transcribe(model, recording, fs)
 
 print("Wake-word detection started. Say 'Hey Aria'...")
 
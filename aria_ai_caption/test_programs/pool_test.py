@@ -0,0 +1,93 @@
+#Tests ollama_pool.py routing without a GPU. Starts a few local stand-in Ollama servers
+#(fast, one that slows down and a broken one), sends requests through the pool from several threads and prints
+#how the requests were spread and which backends were ejected.
+#Run from the test_programs folder: python pool_test.py
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import ollama_pool
+from ollama_pool import BackendPool
+
+STAND_INS = {
+    11501: {'delay': 0.2, 'fail': False}, #fast
+    11502: {'delay': 0.2, 'fail': False, 'slow_after': 8, 'slow_delay': 1.5}, #slows down, should get ejected
+    11503: {'delay': 0.1, 'fail': True},  #broken (500s), should get ejected
+}
+NUM_REQUESTS = 60
+NUM_THREADS = 4
+ollama_pool.BASELINE_SAMPLES = 5 #each stand-in only sees a few requests
+
+def make_handler(delay, fail, slow_after=None, slow_delay=None):
+    class StandInOllama(BaseHTTPRequestHandler):
+        def do_GET(self): #/api/tags, used by the health probe
+            self.reply(200, {'models': []})
+
+        def do_POST(self): #/api/generate
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            self.server.handled = getattr(self.server, 'handled', 0) + 1
+            time.sleep(slow_delay if slow_after and self.server.handled > slow_after else delay)
+            if fail:
+                self.reply(500, {'error': 'stand-in failure'})
+                return
+            self.reply(200, {
+                'model': request.get('model', 'llava-phi3'),
+                'created_at': '2024-01-01T00:00:00Z',
+                'response': f"Caption from port {self.server.server_port}.",
+                'done': True,
+                'eval_count': 10,
+                'eval_duration': int(delay * 1e9),
+            })
+
+        def reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass #keep the output readable
+    return StandInOllama
+
+for port, behaviour in STAND_INS.items():
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(**behaviour))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+pool = BackendPool.from_config([
+    {'host': f"http://127.0.0.1:{port}", 'name': f"port-{port}"} for port in STAND_INS
+])
+pool.start_health_checks(interval=1.0)
+
+results = {'ok': 0, 'failed': 0}
+lock = threading.Lock()
+
+def worker(count):
+    for _ in range(count):
+        try:
+            with pool.lease() as backend:
+                backend.client.generate(model="llava-phi3", prompt="test")
+            outcome = 'ok'
+        except Exception:
+            outcome = 'failed'
+        with lock:
+            results[outcome] += 1
+
+start = time.time()
+threads = [threading.Thread(target=worker, args=(NUM_REQUESTS // NUM_THREADS,)) for _ in range(NUM_THREADS)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+
+print(f"\n{NUM_REQUESTS} requests in {time.time() - start:.2f} seconds: {results}")
+for name, stats in pool.stats().items():
+    print(f"{name}: requests={stats['requests']} errors={stats['errors']} "
+          f"avg_latency={stats['avg_latency']} baseline={stats['baseline_latency']} healthy={stats['healthy']} ejected={stats['ejected']} "
+          f"last_error={stats['last_error']}")
@@ -13,16 +13,22 @@ import torch
 import base64
 import io
 import threading
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from frame_buffer import FrameRingBuffer
+from display import FrameDisplay
 
 # === Initialize Ollama client ===
 print("Connecting to Ollama...")
 client = Client()
 print("LLaVA (Ollama) client initialized.")
+MODEL_SIZE = (256, 256) #frames are sent to llava at this size
 
 # === Streaming Observer Class ===
 class StreamingObserver:
     def __init__(self):
-        self.last_image = None
+        self.frames = FrameRingBuffer() #last few rgb frames, written by the sdk callback
         self.last_caption_time = 0
         self.cooldown = 1.5  # seconds between captions
         self.caption = "Waiting for image..."
@@ -30,21 +36,24 @@ class StreamingObserver:
 
     def on_image_received(self, image: np.ndarray, record: ImageDataRecord):
         if record.camera_id == aria.CameraId.Rgb:
-            self.last_image = np.rot90(image, -1)
+            self.frames.write(image, record.capture_timestamp_ns)
             self.maybe_caption()
 
     def maybe_caption(self):
         now = time.time()
         if (
-            self.last_image is not None
+            self.frames.latest_seq()
             and not self.caption_in_progress
             and now - self.last_caption_time >= self.cooldown
         ):
+            frame = self.frames.copy(size=MODEL_SIZE)
+            if frame is None:
+                return
             print("\nTriggering captioning...")
             self.caption_in_progress = True
             self.last_caption_time = now
             threading.Thread(
-                target=self._caption_worker, args=(self.last_image.copy(),)
+                target=self._caption_worker, args=(frame.image,)
             ).start()
 
     def _caption_worker(self, image):
@@ -61,9 +70,8 @@ class StreamingObserver:
 
     def generate_caption(self, np_img: np.ndarray) -> str:
         try:
-            # Convert image to PIL and resize
-            image = Image.fromarray(np_img).convert("RGB")
-            image = image.resize((256, 256))
+            #np_img is already the upright MODEL_SIZE pyramid level, only the png encode is left
+            image = Image.fromarray(np_img)
 
             # Encode to base64
             buffer = io.BytesIO()
@@ -81,11 +89,11 @@ class StreamingObserver:
             return f"Exception: {e}"
         
     def ask_follow_up(self, question: str) -> str:
-        if self.last_image is None:
-            return "No image available yet for follow-up."
-
         try:
-            image = Image.fromarray(self.last_image).convert("RGB").resize((256, 256))
+            with self.frames.view() as frame:
+                if frame is None:
+                    return "No image available yet for follow-up."
+                image = Image.fromarray(frame.level(MODEL_SIZE))
             buffer = io.BytesIO()
             image.save(buffer, format="PNG")
             image_b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
@@ -149,8 +157,7 @@ streaming_client.subscribe()
 print("✅ Connected to Aria. Streaming started.")
 
 # === OpenCV Display Loop ===
-cv2.namedWindow("Aria RGB + LLaVA Caption", cv2.WINDOW_NORMAL)
-cv2.resizeWindow("Aria RGB + LLaVA Caption", 640, 480)
+display = FrameDisplay(observer.frames, "Aria RGB + LLaVA Caption") #redraws only on new frames
 
 # === Launch user input thread for follow-up questions ===
 def follow_up_input_loop(observer: StreamingObserver):
@@ -167,24 +174,9 @@ input_thread.start()
 
 try:
     while True:
-        if observer.last_image is not None:
-            frame = cv2.cvtColor(observer.last_image, cv2.COLOR_RGB2BGR)
-            # Draw caption
-            cv2.putText(
-                frame,
-                observer.caption,
-                (30, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (255, 255, 255),
-                2,
-                cv2.LINE_AA,
-            )
-            cv2.imshow("Aria RGB + LLaVA Caption", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+        display.render(observer.caption)
+        if display.poll_key() == ord("q"):
             break
-        
-        time.sleep(0.01)  # Sleep for 10ms
 
 except KeyboardInterrupt:
     print("\nInterrupted by user.")
@@ -0,0 +1,38 @@
+#Tests scene_change.py without the glasses: an exposure change on the same view must not
+#trigger a new caption, a different view must.
+#Run from the test_programs folder: python scene_change_test.py
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from scene_change import SceneChangeDetector
+
+def scene(seed):
+    #smooth synthetic view: a few bright and dark blobs on a gradient, 256x256 rgb
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:256, 0:256].astype(np.float32)
+    grey = 60 + 0.4 * x
+    for _ in range(6):
+        cx, cy, r = rng.uniform(0, 256), rng.uniform(0, 256), rng.uniform(20, 60)
+        grey += rng.uniform(-80, 80) * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * r * r))
+    grey = np.clip(grey, 0, 255)
+    return np.repeat(grey[:, :, None], 3, axis=2).astype(np.uint8)
+
+def gain(image, factor):
+    return np.clip(image.astype(np.float32) * factor, 0, 255).astype(np.uint8)
+
+frame = scene(1)
+for factor in (0.7, 0.5, 1.3):
+    detector = SceneChangeDetector(min_interval=0, max_interval=None)
+    assert detector.check(frame, now=0.0)
+    changed = detector.check(gain(frame, factor), now=1.0)
+    print(f"gain {factor}: score {detector.last_score:.3f}")
+    assert not changed, f"exposure gain {factor} counted as a scene change (score {detector.last_score:.3f})"
+
+detector = SceneChangeDetector(min_interval=0, max_interval=None)
+detector.check(frame, now=0.0)
+assert detector.check(scene(2), now=1.0), f"different view not detected (score {detector.last_score:.3f})"
+print(f"new view: score {detector.last_score:.3f}")
+print("scene change ok")
@@ -0,0 +1,85 @@
+#Tests that /caption/stream drops the "I see ..." preamble from the streamed tokens and sentences,
+#not just from the final caption. Starts a local stand-in Ollama server that streams a caption
+#starting with "I can see" a few characters at a time, so no GPU or model is needed.
+#Run from the test_programs folder: python stream_clean_test.py
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 11511
+RAW_CAPTION = "I can see a red mug on a desk. A laptop is open next to it."
+CHUNK_SIZE = 3 #characters per streamed token, so the preamble arrives split over several tokens
+
+class StandInOllama(BaseHTTPRequestHandler):
+    def do_GET(self): #/api/tags, used by the health probe
+        self.reply_json({'models': []})
+
+    def do_POST(self): #/api/generate, streamed as json lines like ollama does
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        chunk = {'model': request.get('model', 'llava-phi3'), 'created_at': '2024-01-01T00:00:00Z'}
+        for start in range(0, len(RAW_CAPTION), CHUNK_SIZE):
+            self.write_line({**chunk, 'response': RAW_CAPTION[start:start + CHUNK_SIZE], 'done': False})
+        self.write_line({**chunk, 'response': '', 'done': True, 'context': [1, 2, 3],
+                         'eval_count': 10, 'eval_duration': 100000000})
+
+    def write_line(self, payload):
+        self.wfile.write(json.dumps(payload).encode() + b"\n")
+        self.wfile.flush()
+
+    def reply_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass #keep the output readable
+
+server = ThreadingHTTPServer(("127.0.0.1", PORT), StandInOllama)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+#point caption_server at the stand-in before importing it
+backends = os.path.join(tempfile.mkdtemp(), "backends.json")
+with open(backends, "w") as f:
+    json.dump([{'host': f'http://127.0.0.1:{PORT}'}], f)
+os.environ["CAPTION_BACKENDS"] = backends
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import caption_server
+
+with open(os.path.join(os.path.dirname(__file__), "image.png"), "rb") as f:
+    image = f.read()
+
+response = caption_server.app.test_client().post(
+    "/caption/stream", data=image, content_type="image/png", buffered=True
+)
+
+events = []
+event = None
+for line in response.get_data(as_text=True).splitlines():
+    if line.startswith("event: "):
+        event = line[len("event: "):]
+    elif line.startswith("data: "):
+        events.append((event, json.loads(line[len("data: "):])))
+
+tokens = "".join(payload['text'] for name, payload in events if name == "token")
+sentences = [payload['text'] for name, payload in events if name == "sentence"]
+done = [payload for name, payload in events if name == "done"]
+print("tokens:   ", repr(tokens))
+print("sentences:", sentences)
+
+assert done, f"no done event: {events}"
+expected = "a red mug on a desk. A laptop is open next to it."
+assert done[0]['text'] == expected, done[0]
+assert sentences and sentences[0] == "a red mug on a desk.", sentences
+assert tokens.strip() == expected, tokens
+print("stream clean ok")
+server.shutdown()
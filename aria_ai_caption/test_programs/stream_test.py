@@ -0,0 +1,34 @@
+#Tests the streaming caption endpoint on caption_server.py with an imported image.
+#Prints each sentence as soon as it arrives and the time to first sentence (when tts could start)
+import json
+import time
+import requests
+
+SERVER = "http://127.0.0.1:8000" #change to your caption server address
+image_path = "image.png"
+
+start_time = time.time()
+first_sentence_time = None
+
+with open(image_path, "rb") as f:
+    files = {'image': ('frame.png', f, 'image/png')}
+    response = requests.post(f"{SERVER}/caption/stream", files=files, stream=True, timeout=30)
+
+event = None
+for line in response.iter_lines(decode_unicode=True):
+    if line.startswith("event: "):
+        event = line[len("event: "):]
+    elif line.startswith("data: "):
+        payload = json.loads(line[len("data: "):])
+        if event == "sentence":
+            if first_sentence_time is None:
+                first_sentence_time = time.time() - start_time
+            print(f"[{time.time() - start_time:.2f}s] {payload['text']}")
+        elif event == "done":
+            print("Full caption:", payload['text'], "(cached)" if payload['cached'] else "")
+        elif event == "error":
+            print("Server error:", payload['error'])
+
+if first_sentence_time is not None:
+    print(f"Time to first sentence: {first_sentence_time:.2f} seconds")
+print(f"Total duration: {time.time() - start_time:.2f} seconds")
@@ -0,0 +1,83 @@
+#CPU benchmark of the STT backends in stt.py: load time, real time factor and word error rate.
+#Give it WAV files with a reference transcript next to each one (same name, .txt):
+#   clips/what_is_ahead.wav + clips/what_is_ahead.txt ("what is ahead of me")
+#Run from the test_programs folder:
+#   python stt_benchmark.py clips/*.wav
+#   python stt_benchmark.py clips/*.wav --configs whisper:base faster-whisper:base:int8 faster-whisper:small:int8 --threads 4
+#RTF = seconds spent transcribing / seconds of audio (below 1 is faster than real time).
+import argparse
+import os
+import re
+import sys
+import time
+
+import scipy.io.wavfile as wavfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import audio
+import stt
+
+DEFAULT_CONFIGS = ["whisper:base", "faster-whisper:base:int8"]
+REPEATS = 3 #timed runs per clip, the fastest counts (the first run also warms up caches)
+
+def normalise(text):
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+
+def word_errors(reference, hypothesis):
+    #word level levenshtein distance: substitutions + insertions + deletions
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+def load_clips(paths):
+    clips = []
+    for path in paths:
+        fs, data = wavfile.read(path)
+        with open(os.path.splitext(path)[0] + ".txt") as f:
+            reference = f.read().strip()
+        samples = audio.to_model_input(data, fs)
+        clips.append((os.path.basename(path), samples, len(samples) / audio.SAMPLE_RATE, reference))
+    return clips
+
+def benchmark(config, clips, threads):
+    name, model_size, compute_type = (config.split(":") + [stt.COMPUTE_TYPE])[:3]
+    backend = stt.load_backend(name, model_size, compute_type=compute_type, threads=threads)
+    print(f"\n{config}: loaded in {backend.load_seconds:.1f}s")
+
+    total_audio = total_time = 0.0
+    errors = words = 0
+    for clip_name, samples, seconds, reference in clips:
+        best = None
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            text = backend.transcribe(samples, language="en")["text"].strip()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        clip_errors = word_errors(normalise(reference), normalise(text))
+        errors += clip_errors
+        words += len(normalise(reference))
+        total_audio += seconds
+        total_time += best
+        print(f"  {clip_name}: {seconds:.1f}s audio, {best:.2f}s, RTF {best / seconds:.3f}, "
+              f"{clip_errors} word errors | {text}")
+    wer = errors / words if words else 0.0
+    return total_time / total_audio, wer, backend.load_seconds
+
+parser = argparse.ArgumentParser()
+parser.add_argument("wavs", nargs="+", help="WAV files, each with a .txt reference transcript next to it")
+parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                    help="backend:model[:compute_type], e.g. faster-whisper:base:int8")
+parser.add_argument("--threads", type=int, default=stt.CPU_THREADS, help="CPU threads (0 = library default)")
+args = parser.parse_args()
+
+clips = load_clips(args.wavs)
+print(f"{len(clips)} clips, {sum(c[2] for c in clips):.1f}s of audio")
+results = [(config,) + benchmark(config, clips, args.threads) for config in args.configs]
+
+print(f"\n{'config':<32}{'RTF':>8}{'WER':>8}{'load s':>8}")
+for config, rtf, wer, load_seconds in results:
+    print(f"{config:<32}{rtf:>8.3f}{wer:>8.1%}{load_seconds:>8.1f}")
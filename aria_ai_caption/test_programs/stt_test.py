@@ -2,9 +2,11 @@
 import whisper
 import sounddevice as sd
 import numpy as np
-import tempfile
 import os
-import scipy.io.wavfile as wavfile
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import audio
 
 model = whisper.load_model("base")  # or "tiny", "small", etc.
 
@@ -16,14 +18,10 @@ def record_audio(duration=5, fs=16000):
     return recording, fs
 
 def transcribe(recording, fs):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-        wavfile.write(f.name, fs, recording)
-        print("Transcribing...")
-        result = model.transcribe(f.name)
-        os.remove(f.name)
-        return result["text"]
+    print("Transcribing...")
+    return audio.transcribe(model, recording, fs)
 
 # Example usage:
-audio, rate = record_audio(duration=4)
-text = transcribe(audio, rate)
+recording, rate = record_audio(duration=4)
+text = transcribe(recording, rate)
 print("You said:", text)
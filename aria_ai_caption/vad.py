@@ -0,0 +1,116 @@
+# Voice activity endpointing for spoken questions
+# Instead of a fixed 4 second recording, the live mic stream (audio_stream.py) is classified in
+# 30 ms frames and the recording ends once the speaker has been quiet for TRAILING_SILENCE.
+# A frame is speech when its energy is well above the running noise floor and its zero crossing
+# rate looks voiced (hiss and fans cross zero far more often than speech); very loud frames count
+# regardless, so fricatives ("s", "f") don't end a question early. The segment handed to whisper
+# starts PRE_ROLL before the first speech frame and ends just after the last one.
+#
+# Usage:
+#   samples, info = record_utterance(shared_stream())   #empty if nobody spoke within START_TIMEOUT
+#   print(info)   #{'reason': 'silence', 'speech_seconds': 1.4, 'seconds': 2.3, ...}
+import time
+
+import numpy as np
+
+FRAME_SECONDS = 0.03         #classification frame
+ENERGY_MARGIN_DB = 10.0      #speech is at least this far above the noise floor
+LOUD_MARGIN_DB = 20.0        #this far above counts as speech whatever the zero crossing rate
+ZCR_MAX = 0.3                #zero crossings per sample above this look like noise, not voice
+MIN_FLOOR_DB = -70.0         #floor never drops below this (digital silence would make everything speech)
+FLOOR_ADAPTATION = 0.05      #how fast the noise floor follows non-speech frames
+CALIBRATION_SECONDS = 0.5    #audio before the recording used to measure the noise floor
+
+MIN_SPEECH_SECONDS = 0.12    #speech must last this long to start a segment (clicks and taps don't)
+TRAILING_SILENCE = 0.8       #seconds of silence that end the question
+PRE_ROLL = 0.3               #seconds kept before the first speech frame
+TAIL = 0.15                  #seconds kept after the last speech frame
+MAX_SECONDS = 10.0           #longest question, measured from the start of speech
+START_TIMEOUT = 4.0          #give up if nobody starts talking within this long
+
+
+class EnergyVAD:
+    def __init__(self, fs, frame_seconds=FRAME_SECONDS, margin_db=ENERGY_MARGIN_DB,
+                 loud_margin_db=LOUD_MARGIN_DB, zcr_max=ZCR_MAX):
+        self.fs = fs
+        self.frame_samples = int(frame_seconds * fs)
+        self.margin_db = margin_db
+        self.loud_margin_db = loud_margin_db
+        self.zcr_max = zcr_max
+        self.floor_db = MIN_FLOOR_DB
+
+    def features(self, samples):
+        #(energy in dB, zero crossing rate) per whole frame, vectorised over the chunk
+        n = len(samples) // self.frame_samples
+        frames = samples[:n * self.frame_samples].reshape(n, self.frame_samples)
+        energy_db = 20 * np.log10(np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+        return energy_db, zcr
+
+    def calibrate(self, samples):
+        #noise floor from audio that is (mostly) not speech, e.g. just before the recording
+        energy_db, _ = self.features(samples)
+        if len(energy_db):
+            self.floor_db = max(MIN_FLOOR_DB, float(np.percentile(energy_db, 20)))
+
+    def classify(self, samples):
+        #bool per frame; the noise floor follows the frames that are not speech
+        energy_db, zcr = self.features(samples)
+        speech = np.zeros(len(energy_db), dtype=bool)
+        for i in range(len(energy_db)):
+            above = energy_db[i] - self.floor_db
+            speech[i] = above >= self.loud_margin_db or (above >= self.margin_db and zcr[i] <= self.zcr_max)
+            if not speech[i]:
+                self.floor_db = max(MIN_FLOOR_DB, self.floor_db + FLOOR_ADAPTATION * (energy_db[i] - self.floor_db))
+        return speech
+
+
+def record_utterance(mic, max_seconds=MAX_SECONDS, trailing_silence=TRAILING_SILENCE, pre_roll=PRE_ROLL,
+                     start_timeout=START_TIMEOUT, min_speech=MIN_SPEECH_SECONDS, vad=None):
+    #mic: a running audio_stream.MicrophoneStream. returns (float32 samples, info)
+    fs = mic.fs
+    vad = vad or EnergyVAD(fs)
+    step = vad.frame_samples
+    vad.calibrate(mic.latest(CALIBRATION_SECONDS))
+
+    began = time.monotonic()
+    position = mic.written
+    give_up = position + int(start_timeout * fs)
+    min_run = max(1, int(round(min_speech * fs / step)))
+    speech_start = last_speech = None
+    run = 0
+    reason = "no_speech"
+    while True:
+        mic.wait_until(position + step)
+        end = mic.written - (mic.written - position) % step
+        samples, first = mic.read(position, end)
+        flags = vad.classify(samples)
+        for i, speech in enumerate(flags):
+            index = first + i * step
+            if speech:
+                run += 1
+                last_speech = index + step
+                if speech_start is None and run >= min_run:
+                    speech_start = index - (run - 1) * step
+            else:
+                run = 0
+        position = first + len(flags) * step
+
+        if speech_start is None:
+            if position >= give_up:
+                break
+        elif position - last_speech >= trailing_silence * fs:
+            reason = "silence"
+            break
+        elif position - speech_start >= max_seconds * fs:
+            reason = "max_length"
+            break
+
+    info = {'reason': reason, 'waited': round(time.monotonic() - began, 3)}
+    if speech_start is None:
+        info.update(seconds=0.0, speech_seconds=0.0)
+        return np.zeros(0, dtype=np.float32), info
+    segment, _ = mic.read(speech_start - int(pre_roll * fs), min(last_speech + int(TAIL * fs), position))
+    info.update(seconds=round(len(segment) / fs, 3), speech_seconds=round((last_speech - speech_start) / fs, 3))
+    return segment, info
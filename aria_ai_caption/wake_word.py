@@ -1,51 +1,45 @@
 # Created as an import module for server_llava_caption. Functionally same as hey_aria.py
 # NEEDED as module for stt programs
 
-import whisper
-import sounddevice as sd
+import stt
 import numpy as np
-import tempfile
 import os
-import time
-import scipy.io.wavfile as wavfile
 from rapidfuzz import fuzz #allows for wider range of misheard wake words
 import sys
-
-model = whisper.load_model("base")
+import audio #recordings go to whisper in memory
+from audio_stream import shared_stream #continuous mic capture, nothing is missed between windows
 
 WAKE_PHRASES = ["hey aria", "hey area", "hey arya"]
 THRESHOLD = 80 #threshold for wake word difference
+WINDOW_SECONDS = 3.0 #audio transcribed per check, longer than the wake phrase with room to spare
+HOP_SECONDS = 1.5    #a new window every hop; windows overlap so a phrase is never split across two
 
 def is_wake_phrase(text, phrases=WAKE_PHRASES, threshold=THRESHOLD):
     return any(fuzz.partial_ratio(text.lower(), phrase) >= threshold for phrase in phrases)
 
-def record_chunk(duration=4, fs=16000): #records for 4 seconds, change duration for longer sample
-    print("Listening for wake word...")
-    audio = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
-    sd.wait()
-    return audio, fs
+def record_chunk(duration=4): #the next 4 seconds from the shared mic stream
+    mic = shared_stream()
+    return mic.record(duration), mic.fs
 
-def transcribe(audio, fs, model):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-        wavfile.write(f.name, fs, audio)
-        result = model.transcribe(f.name)
-        os.remove(f.name)
-        return result["text"]
+def transcribe(recording, fs, model):
+    return audio.transcribe(model, recording, fs)
 
-def wait_for_wake_word(model):
+def wait_for_wake_word(model=None):
+    #model: defaults to the shared one from stt.get_model(), loaded on first use rather than at import
+    model = model or stt.get_model()
     print("Waiting for 'Hey Aria' to start captioning...")
+    mic = shared_stream()
     try:
-        while True:
-            audio_chunk, rate = record_chunk()
-            text = transcribe(audio_chunk, rate, model)
+        #the mic keeps recording while a window is transcribed; if whisper falls behind the
+        #next window is the newest one, not a backlog
+        for _, window in mic.windows(WINDOW_SECONDS, HOP_SECONDS):
+            text = transcribe(window, mic.fs, model)
             print("Heard:", text)
 
             if is_wake_phrase(text):
                 print("Wake phrase detected!")
                 os.system('say "How can I help?"')
                 break
-
-            time.sleep(0.01)
     except KeyboardInterrupt:
         print("\nWake-word detection interrupted.")
         sys.exit(0)
\ No newline at end of file